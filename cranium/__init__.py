@@ -23,6 +23,17 @@ from sklearn.metrics import mean_squared_error
 from scipy.integrate import simps
 import scipy.stats as stats
 import re
+import json
+import warnings
+import tempfile
+import shutil
+import hashlib
+import gzip
+import bz2
+import lzma
+import concurrent.futures as cf
+from collections import OrderedDict
+from collections.abc import Mapping
 
 class brain:
 	''' Object to manage biological data and associated functions. '''
@@ -238,11 +249,36 @@ class brain:
 		self.pcamed = PCA()
 		self.pcamed.fit(self.median[['y','z']])
 
+	def calculate_pca_moments(self,data,threshold,radius,microns,dims=['x','y','z'],weighted=False):
+		'''
+		Calculate PCA transformation matrix, :py:attr:`brain.pcamed`, from the moments of the median filtered and thresholded data without creating a dataframe of points
+
+		Each z plane is filtered and added to a :py:class:`pca_moments` accumulator in turn, so only one filtered plane is held in memory at a time. :py:attr:`brain.median` is not created.
+
+		.. note:: The sign of each component may differ from :py:class:`sklearn.decomposition.PCA`, which depends on the individual points
+
+		:param array data: 3D array containing raw probability data
+		:param float threshold: Value between 0 and 1 indicating the lower cutoff for positive signal
+		:param int radius: Radius of neighborhood that should be considered for the median filter
+		:param array microns: Array with three values representing the x,y,z micron dimensions of the voxel
+		:param list dims: (or None) Dimensions to include in the PCA, e.g. ['y','z'] to match :py:func:`brain.calculate_pca_median_2d`
+		:param bool weighted: (or None) Set to True to weight each point by its probability value
+		'''
+
+		self.pcamed = pca_moments(weighted=weighted)
+
+		#Filter each plane and add its moments to the accumulator
+		for z in range(data.shape[0]):
+			plane = median(median(data[z],disk(radius)),disk(radius))
+			self.pcamed.add_plane(plane,z,threshold,microns)
+
+		self.pcamed.fit(dims)
+
 	def pca_transform_2d(self,df,pca,comp_order,fit_dim,deg=2,mm=None,vertex=None,flip=None):
 		'''
 		Transforms `df` in 2D based on the PCA object, `pca`, whose transformation matrix has already been calculated
 
-		Calling :py:func:`brain.align_data` creates :py:attr:`brain.df_align`
+		Calling :py:func:`brain.fit_transform` creates :py:attr:`brain.df_align`
 
 		.. warning:: `fit_dim` is not used to determine which dimensions to fit. Defaults to x and z
 
@@ -256,14 +292,13 @@ class brain:
 		:param Bool flip: (or None) Boolean value to determine if the data should be rotated by 180 degrees
 		'''
 
-		fit = pca.transform(df[['y','z']])
-		df_fit = pd.DataFrame({
-			'x':df.x,
-			'y':fit[:,comp_order[1]-1],
-			'z':fit[:,comp_order[2]-1]
-			})
+		self.comp_order = comp_order
+		self.twoD = True
 
-		self.align_data(df_fit,fit_dim,deg=2,mm=None,vertex=None,flip=None)
+		tf = AlignmentTransform()
+		tf.add_pca(pca,comp_order,twoD=True)
+
+		self.fit_transform(df,tf,fit_dim,deg=deg,mm=mm,vertex=vertex,flip=flip)
 
 	def pca_transform_3d(self,df,pca,comp_order,fit_dim,deg=2,mm=None,vertex=None,flip=None):
 		'''
@@ -279,14 +314,13 @@ class brain:
 		:param Bool flip: (or None) Boolean value to determine if the data should be rotated by 180 degrees
 		'''
 
-		fit = pca.transform(df[['x','y','z']])
-		df_fit = pd.DataFrame({
-			'x':fit[:,comp_order[0]],
-			'y':fit[:,comp_order[1]],
-			'z':fit[:,comp_order[2]]
-			})
+		self.comp_order = comp_order
+		self.twoD = False
+
+		tf = AlignmentTransform()
+		tf.add_pca(pca,comp_order)
 
-		self.align_data(df_fit,fit_dim,deg=2,mm=None,vertex=None,flip=None)
+		self.fit_transform(df,tf,fit_dim,deg=deg,mm=mm,vertex=vertex,flip=flip)
 	
 	def align_data(self,df_fit,fit_dim,deg=2,mm=None,vertex=None,flip=None):
 		'''
@@ -310,98 +344,96 @@ class brain:
 
 			Math model object fit to data in brain object
 		'''
-		
+
+		self.fit_transform(df_fit,AlignmentTransform(),fit_dim,deg=deg,mm=mm,vertex=vertex,flip=flip)
+
+	def fit_transform(self,df,transform,fit_dim,deg=2,mm=None,vertex=None,flip=None):
+		'''
+		Fit the math model to the data after `transform`, add the vertex translation and 180 degree rotation to `transform` and apply the complete transformation to the data in a single step
+
+		Creates :py:attr:`brain.df_align`, :py:attr:`brain.mm`, :py:attr:`brain.vertex`, :py:attr:`brain.flip` and :py:attr:`brain.transform`
+
+		:param pd.DataFrame df: Dataframe containing thresholded xyz data
+		:param transform: (:py:class:`AlignmentTransform`) Transformation that has already been applied to the data before fitting, e.g. PCA
+		:param array fit_dim: Array of length two containing two strings describing the first and second axis for fitting the model, e.g. ['x','z']
+		:param int deg: (or None) Degree of the function that should be fit to the model. deg=2 by default
+		:param mm: (:py:class:`math_model` or None) Math model for primary channel
+		:param array vertex: (or None) Array of type [vx,vy,vz] (:py:attr:`brain.vertex`) indicating the translation values
+		:param Bool flip: (or None) Boolean value to determine if the data should be rotated by 180 degrees
+
+		.. py:attribute:: brain.flip
+
+			Boolean indicating whether the data was rotated by 180 degrees
+
+		.. py:attribute:: brain.transform
+
+			:py:class:`AlignmentTransform` containing the complete transformation from the input data to :py:attr:`brain.df_align`
+		'''
+
+		X = df[['x','y','z']].values
+		A,b = transform.matrix[:3,:3],transform.matrix[:3,3]
+
+		#Calculate power sums of the fit dimensions once and reuse them for each model
+		i0,i1 = ['x','y','z'].index(fit_dim[0]),['x','y','z'].index(fit_dim[1])
+		sums = poly_sums(deg)
+		sums.add(np.dot(X,A[i0])+b[i0],np.dot(X,A[i1])+b[i1])
+		model = sums.fit()
+		p = np.poly1d(model)
+
 		#If vertex for translation is not included
-		if vertex == None and deg==2:
-			#Calculate model
-			model = np.polyfit(df_fit[fit_dim[0]],df_fit[fit_dim[1]],deg=deg)
-			p = np.poly1d(model)
-
-			#Find vertex
-			a = -model[1]/(2*model[0])
-			if fit_dim[0] == 'x':
-				vx = a
-				if fit_dim[1] == 'y':
-					vy = p(vx)
-					vz = df_fit.z.mean()
-				else:
-					vz = p(vx)
-					vy = df_fit.y.mean()
-			elif fit_dim[0] == 'y':
-				vy = a
-				if fit_dim[1] == 'x':
-					vx = p(a)
-					vz = df_fit.z.mean()
-				else:
-					vz = p(a)
-					vx = df_fit.x.mean()
-			elif fit_dim[0] == 'z':
-				vz = a
-				if fit_dim[1] == 'x':
-					vx = p(a)
-					vy = df_fit.y.mean()
-				else:
-					vy = p(a)
-					vx = df_fit.x.mean()
-			self.vertex = [vx,vy,vz]
-		elif deg == 1:
-			#Calculate model
-			model = np.polyfit(df_fit[fit_dim[0]],df_fit[fit_dim[1]],deg=deg)
-			p = np.poly1d(model)
-
-			if fit_dim[0] == 'x':
-				vx = df_fit.x.mean()
-				if fit_dim[1] == 'y':
-					vy = p(vx)
-					vz = df_fit.z.mean()
-				else:
-					vz = p(vx)
-					vy = df_fit.y.mean()
-			elif fit_dim[0] == 'y':
-				vy = df_fit.y.mean()
-				if fit_dim[1] == 'x':
-					vx = p(vy)
-					vz = df_fit.z.mean()
-				else:
-					vz = p(vy)
-					vx = df_fit.x.mean()
-			elif fit_dim[0] == 'z':
-				vz = df_fit.z.mean()
-				if fit_dim[1] == 'x':
-					vx = p(vz)
-					vy = df_fit.y.mean()
-				else:
-					vy = p(vz)
-					vx = df_fit.x.mean()
-			self.vertex = [vx,vy,vz]
+		if (vertex is None and deg==2) or deg == 1:
+			v = list(np.dot(A,X.mean(axis=0))+b)
+
+			#Find vertex along the first fit dimension and evaluate the model at that position
+			if deg == 2:
+				v[i0] = -model[1]/(2*model[0])
+			v[i1] = p(v[i0])
+			self.vertex = v
 		else:
 			self.vertex = vertex
 
 		#Translate data so that the vertex is at the origin
-		self.df_align = pd.DataFrame({
-			'x': df_fit.x - self.vertex[0],
-			'y': df_fit.y - self.vertex[1],
-			'z': df_fit.z - self.vertex[2]
-			})
+		transform.translate(self.vertex)
+		sums.translate(self.vertex[i0],self.vertex[i1])
 
 		#Rotate data by 180 degrees if necessary
 		if flip == None or flip == False:
-			#Calculate model
-			model = np.polyfit(df_fit[fit_dim[0]],df_fit[fit_dim[1]],deg=deg)
-			p = np.poly1d(model)
-
 			#If a is less than 0, rotate data
-			if model[0] < 0:
-				self.df_align = self.flip_data(self.df_align)
-		elif flip == True:
-			self.df_align = self.flip_data(self.df_align)
+			flip = model[0] < 0
+		if flip == True:
+			transform.flip()
+
+			#Rotation about y negates x and z
+			sign = [-1,1,-1]
+			sums.scale(sign[i0],sign[i1])
+		self.flip = bool(flip)
 
 		#Calculate final math model
 		if mm == None:
-			self.mm = self.fit_model(self.df_align,deg,fit_dim)
+			self.mm = math_model(sums.fit())
 		else:
 			self.mm = mm
 
+		self.fit_dim = fit_dim
+		self.deg = deg
+		self.transform = transform
+		self.df_align = transform.apply(X)
+
+	def apply_transform(self,df,transform,mm):
+		'''
+		Align data using the transformation and math model calculated for another channel, e.g. the primary channel
+
+		Creates :py:attr:`brain.df_align`, :py:attr:`brain.mm` and :py:attr:`brain.transform`
+
+		:param pd.DataFrame df: Dataframe containing thresholded xyz data
+		:param transform: (:py:class:`AlignmentTransform`) Complete transformation from the primary channel, :py:attr:`brain.transform`
+		:param mm: (:py:class:`math_model`) Math model for primary channel
+		'''
+
+		self.transform = transform
+		self.mm = mm
+		self.df_align = transform.apply(df[['x','y','z']].values)
+
 	def flip_data(self,df):
 		'''
 		Rotate data by 180 degrees
@@ -666,10 +698,11 @@ class embryo:
 			mthresh,radius,microns)
 		self.pca = self.chnls[primary_key].pcamed
 
-		self.chnls[primary_key].align_data(self.chnls[primary_key].df_thresh,
+		self.chnls[primary_key].pca_transform_3d(self.chnls[primary_key].df_thresh,
 			self.pca,comp_order,fit_dim,deg=deg)
 		self.mm = self.chnls[primary_key].mm
 		self.vertex = self.chnls[primary_key].vertex
+		self.transform = self.chnls[primary_key].transform
 
 		self.chnls[primary_key].transform_coordinates()
 
@@ -679,9 +712,8 @@ class embryo:
 			if ch != primary_key:
 				self.chnls[ch].preprocess_data(gthresh,scale,microns)
 				
-				self.chnls[ch].align_data(self.chnls[ch].df_thresh,
-					self.pca,comp_order,fit_dim,deg=deg,
-					mm = self.mm, vertex = self.vertex)
+				self.chnls[ch].apply_transform(self.chnls[ch].df_thresh,
+					self.transform,self.mm)
 
 				self.chnls[ch].transform_coordinates()
 				print(ch,'processed')
@@ -700,9 +732,12 @@ class embryo:
 
 		print('Projections generated')
 
-	def save_psi(self):
+	def save_psi(self,binary=False,sort_ac=False):
 		'''
-		Save all channels into psi files following the naming scheme [:py:attr:`embryo.name`]_[:py:attr:`embryo.number`]_[`channel name`].psi
+		Save all channels into psi files following the naming scheme [:py:attr:`embryo.name`]_[:py:attr:`embryo.number`]_[`channel name`].psi with a summary that includes the coefficients of the math model (:py:func:`write_summary`)
+
+		:param bool binary: (or None) Set to True to also write a binary copy of each psi file with :py:func:`write_binary`
+		:param bool sort_ac: (or None) Set to True to write points sorted by ac with an index of blocks, which :py:func:`read_psi` uses to read a range of ac
 		'''
 
 		columns = ['x','y','z','ac','r','theta']
@@ -710,10 +745,123 @@ class embryo:
 		for ch in self.chnls.keys():
 			write_data(os.path.join(self.outdir,
 				self.name+'_'+str(self.number)+'_'+ch+'.psi'),
-				self.chnls[ch].df_align[columns])
+				self.chnls[ch].df_align[columns],
+				mm=self.chnls[ch].mm.cf,binary=binary,sort_ac=sort_ac)
 
 		print('PSIs generated')
 
+	def save_store(self,store):
+		'''
+		Add the points of every channel to a :py:class:`point_store` using :py:attr:`embryo.number` as the sample identifier, with the summary and math model of each channel as metadata
+
+		:param point_store store: Open store that the channels are appended to
+		'''
+
+		columns = ['x','y','z','ac','r','theta']
+
+		for ch in self.chnls.keys():
+			df = self.chnls[ch].df_align[columns]
+			meta = psi_summary(df,self.chnls[ch].mm.cf)
+			meta['name'] = self.name
+			store.append(ch,str(self.number),df,meta)
+
+	def alignment_path(self,directory=None):
+		'''
+		Filepath of the alignment record for this sample following the naming scheme [:py:attr:`embryo.name`]_[:py:attr:`embryo.number`]_alignment.json
+
+		:param str directory: (or None) Directory containing the record, :py:attr:`embryo.outdir` by default
+		:returns: Complete filepath to the alignment record
+		'''
+
+		if directory == None:
+			directory = self.outdir
+
+		return(os.path.join(directory,self.name+'_'+str(self.number)+'_alignment.json'))
+
+	def save_alignment(self,primary_key,source=None):
+		'''
+		Save the alignment of the primary channel to a json file next to the psi files (:py:func:`embryo.alignment_path`) so that it can be applied to channels later without recalculating the PCA or the math model
+
+		The record contains the PCA components, `comp_order`, `vertex`, flip decision, math model coefficients and the complete :py:class:`AlignmentTransform` matrix
+
+		:param str primary_key: Key for the primary structural channel which has been aligned
+		:param str source: (or None) Filename of the image of the primary channel, which :py:func:`embryo.load_alignment` checks before the record is used
+		'''
+
+		s = self.chnls[primary_key]
+
+		D = {
+			'name':self.name,
+			'number':str(self.number),
+			'primary_key':primary_key,
+			'comp_order':[int(i) for i in s.comp_order],
+			'twoD':s.twoD,
+			'fit_dim':list(s.fit_dim),
+			'deg':int(s.deg),
+			'vertex':[float(v) for v in s.vertex],
+			'flip':s.flip,
+			'mm':s.mm.cf.tolist(),
+			'matrix':s.transform.matrix.tolist()
+		}
+		if hasattr(s,'pcamed'):
+			D['components'] = s.pcamed.components_.tolist()
+			D['mean'] = s.pcamed.mean_.tolist()
+		if source != None:
+			D['source'] = source
+
+		self.alignment = D
+		self.write_alignment()
+
+	def write_alignment(self):
+		'''
+		Write :py:attr:`embryo.alignment` to :py:func:`embryo.alignment_path`, e.g. to keep a loaded record with the psi files that it produced
+		'''
+
+		f = open(self.alignment_path(),'w')
+		json.dump(self.alignment,f,indent=1)
+		f.close()
+
+	def load_alignment(self,filepath=None,source=None):
+		'''
+		Read an alignment record created by :py:func:`embryo.save_alignment`
+
+		Creates :py:attr:`embryo.alignment`, :py:attr:`embryo.transform`, :py:attr:`embryo.mm` and :py:attr:`embryo.vertex`
+
+		:param str filepath: (or None) Complete filepath to the record, :py:func:`embryo.alignment_path` by default
+		:param str source: (or None) Filename of the image of the primary channel. Raises a ValueError if the record was saved for a different file or without a filename
+
+		.. py:attribute:: embryo.alignment
+
+			Dictionary containing the contents of the alignment record
+		'''
+
+		if filepath == None:
+			filepath = self.alignment_path()
+
+		f = open(filepath,'r')
+		D = json.load(f)
+		f.close()
+
+		if source != None and D.get('source') != source:
+			raise ValueError('Alignment record '+filepath+' was saved for '+str(D.get('source'))+' instead of '+source)
+
+		self.alignment = D
+
+		self.transform = AlignmentTransform(self.alignment['matrix'])
+		self.mm = math_model(np.array(self.alignment['mm']))
+		self.vertex = self.alignment['vertex']
+
+	def apply_alignment(self,key):
+		'''
+		Align a channel with the transformation in :py:attr:`embryo.transform`, e.g. after :py:func:`embryo.load_alignment`, without refitting
+
+		.. note:: :py:func:`brain.preprocess_data` must be called on the channel first
+
+		:param str key: Name of the channel
+		'''
+
+		self.chnls[key].apply_transform(self.chnls[key].df_thresh,self.transform,self.mm)
+
 	def add_psi_data(self,filepath,key):
 		'''
 		Read psi data into a channel dataframe
@@ -744,603 +892,3013 @@ class math_model:
 		self.cf = model
 		self.p = np.poly1d(model)
 
-class landmarks:
+class pca_moments:
 	'''
-	Class to handle calculation of landmarks to describe structural data
+	Object that accumulates the first and second moments of thresholded voxels plane by plane and calculates a PCA transformation from them
 
-	:param list percbins: (or None) Must be a list of integers between 0 and 100 
-	:param int rnull: (or None) When the r value cannot be calculated it will be set to this value
-	
-	.. py:attribute:: brain.lm_wt_rf
+	Provides the attributes and :py:func:`pca_moments.transform` used from :py:class:`sklearn.decomposition.PCA` so that it can be used in place of :py:attr:`brain.pcamed`
 
-		pd.DataFrame, which wildtype landmarks will be added to
+	:param bool weighted: (or None) Set to True to weight each voxel by its probability value
 
-	.. py:attribute:: brain.lm_mt_rf
+	.. py:attribute:: pca_moments.n
 
-		pd.DataFrame, which mutant landmarks will be added to
+		Number of voxels (or sum of weights) added to the accumulator
 
-	.. py:attribute:: brain.rnull
+	.. py:attribute:: pca_moments.s1
 
-		Integer specifying the value which null landmark calculations will be set to
-	
-	.. py:attribute:: brain.percbins
+		Array of length three containing the sums of x, y and z
 
-		Integer specifying the percentiles which will be used to calculate landmarks
+	.. py:attribute:: pca_moments.s2
+
+		Array of shape (3,3) containing the sums of the products of x, y and z
+
+	.. py:attribute:: pca_moments.components_
+
+		Array of shape (n_components,n_dims) with the principal axes ordered by decreasing variance
+
+	.. py:attribute:: pca_moments.mean_
+
+		Mean of each dimension included in the fit
 	'''
 
-	def __init__(self,percbins=[10,50,90],rnull=15):
+	def __init__(self,weighted=False):
 
-		self.lm_wt_rf = pd.DataFrame()
-		self.lm_mt_rf = pd.DataFrame()
+		self.weighted = weighted
+		self.n = 0.0
+		self.s1 = np.zeros(3)
+		self.s2 = np.zeros((3,3))
 
-		self.rnull = rnull
-		self.percbins = percbins
+	def add_plane(self,plane,z,threshold,microns):
+		'''
+		Add the moments of the voxels above threshold in a single z plane
 
-	def calc_bins(self,Ldf,ac_num,tstep):
+		:param array plane: 2D array of shape [y,x] containing probability data
+		:param int z: Index of the plane in the z dimension
+		:param float threshold: Value between 0 and 1 indicating the lower cutoff for positive signal
+		:param array microns: Array with three values representing the x,y,z micron dimensions of the voxel
 		'''
-		Calculates alpha and theta bins based on ac_num and tstep
 
-		Creates :py:attr:`landmarks.acbins` and :py:attr:`landmarks.tbins`
+		if self.weighted == True:
+			w = np.where(plane > threshold,plane,0).astype(float)
+		else:
+			w = (plane > threshold).astype(float)
 
-		.. warning:: `tstep` does not handle scenarios where 2pi is not evenly divisible by tstep
+		#Collapse weights onto each axis so that no points are created
+		wx = w.sum(axis=0)
+		wy = w.sum(axis=1)
+		n = wx.sum()
+		if n == 0:
+			return
 
-		:param list Ldf: List of dataframes that are being used for the analysis typically accessed by `dict.values()`
-		:param int ac_num: Integer indicating the number of divisions that should be made along alpha
-		:param float tstep: The size of each bin used for alpha
+		xs = np.arange(plane.shape[1])*microns[0]
+		ys = np.arange(plane.shape[0])*microns[1]
+		zc = z*microns[2]
 
-		.. py:attribute:: landmarks.acbins
+		sx,sy = np.dot(xs,wx),np.dot(ys,wy)
+		sxy = np.dot(ys,np.dot(w,xs))
 
-			List containing the boundaries of each bin along alpha based on `ac_num`
+		self.n += n
+		self.s1 += [sx,sy,zc*n]
+		self.s2 += np.array([
+			[np.dot(xs**2,wx),sxy,zc*sx],
+			[sxy,np.dot(ys**2,wy),zc*sy],
+			[zc*sx,zc*sy,zc**2*n]])
 
-		.. py:attribute:: landmarks.tbins
+	def fit(self,dims=['x','y','z']):
+		'''
+		Calculate the PCA transformation from the accumulated moments
 
-			List containing the boundaries of each bin along theta based on `tstep`
+		:param list dims: (or None) Dimensions to include in the PCA, e.g. ['x','y','z'] or ['y','z']
+		:returns: :py:class:`pca_moments` object with fitted attributes
 		'''
 
-		#Find the minimum and maximum values of alpha in the dataset
-		acmin,acmax = 0,0
-		for df in Ldf:
-			if df.ac.min() < acmin:
-				acmin = df.ac.min()
-			if df.ac.max() > acmax:
-				acmax = df.ac.max()
-
-		#Correct min and max values so that arclength is equal on each side
-		if abs(acmin) > acmax:
-			self.acbins = np.linspace(acmin,abs(acmin),ac_num)
-		else:
-			self.acbins = np.linspace(-acmax,acmax,ac_num)
+		i = [['x','y','z'].index(d) for d in dims]
 
-		#Calculate tbins divisions based on tstep
-		self.tbins = np.arange(-np.pi,np.pi+tstep,tstep)
+		self.mean_ = self.s1[i]/self.n
+		cov = (self.s2[np.ix_(i,i)] - self.n*np.outer(self.mean_,self.mean_))/(self.n-1)
 
-	def calc_perc(self,df,snum,dtype,out):
+		#Order eigenvectors by decreasing variance
+		val,vec = np.linalg.eigh(cov)
+		order = np.argsort(val)[::-1]
+		self.explained_variance_ = val[order]
+		self.explained_variance_ratio_ = self.explained_variance_/val.sum()
+		self.components_ = vec[:,order].T
+
+		#Make the largest value of each component positive so the result is deterministic
+		signs = np.sign(self.components_[np.arange(len(i)),np.argmax(np.abs(self.components_),axis=1)])
+		self.components_ = self.components_*signs[:,np.newaxis]
+		self.n_components_ = len(i)
+
+		return(self)
+
+	def transform(self,X):
 		'''
-		Calculate landmarks for a dataframe based on the bins and percentiles that have been previously defined 
+		Apply the PCA transformation to `X`
 
-		:param pd.DataFrame df: Dataframe containing columns x,y,z,alpha,r,theta
-		:param str snum: String containing a sample identifier that can be converted to an integer
-		:param str dtype: String describing the sample group to which the sample belongs, e.g. control or experimental
-		:returns: pd.DataFrame with new landmarks appended
+		:param array X: Array or dataframe of shape (n_points,n_dims)
+		:returns: Array of transformed points
 		'''
 
-		D = {'stype':dtype}
+		return(np.dot(np.asarray(X,dtype=float)-self.mean_,self.components_.T))
 
-		#Go through each arclength bins
-		for a in range(len(self.acbins)):
-			if a+1 < len(self.acbins):
-				arange = [self.acbins[a],self.acbins[a+1]]
+class poly_sums:
+	'''
+	Object containing the power sums of a set of points that are needed to fit a polynomial by least squares
 
-				#Go through each theta bin
-				for t in range(len(self.tbins)):
-					if t+1 < len(self.tbins):
-						trange = [self.tbins[t],self.tbins[t+1]]
+	The sums are calculated in a single pass over the points and can be updated when the points are translated or flipped, so the same points never need to be refit with :py:func:`np.polyfit`
 
-						#Go through each percentile
-						for p in self.percbins:
-							d = df[(df.ac > arange[0]) & (df.ac < arange[1])]
-							d = d[(d.theta > trange[0]) & (d.theta < trange[1])]
+	:param int deg: Maximum degree of the polynomial that will be fit
 
-							#Try to calculate percentile, but set to null if it fails
-							try:
-								r = np.percentile(d.r,p)
-								pts = d[d.r < r].count()['i']
-							except:
-								r = self.rnull
-								pts = 0
+	.. py:attribute:: poly_sums.sx
 
-							#Create name of column based on bins
-							L = []
-							for s in [arange[0],arange[1],trange[0],trange[1]]:
-								L.append(str(np.around(s,decimals=2)))
-							name = '_'.join(L)
+		Array of length 2*deg+1 containing the sum of x**k
 
-							D[name+'_'+str(p)+'_pts'] = pts
-							D[name+'_'+str(p)+'_r'] = r
+	.. py:attribute:: poly_sums.sxy
 
-		out = out.append(pd.Series(D,name=int(snum)))
-		return(out)
+		Array of length deg+1 containing the sum of (x**k)*y
+	'''
 
-	def calc_wt_reformat(self,df,snum):
+	def __init__(self,deg=2):
+
+		self.deg = deg
+		self.sx = np.zeros(2*deg+1)
+		self.sxy = np.zeros(deg+1)
+
+	def add(self,x,y):
 		'''
-		.. warning:: Deprecated function, but includes code pertaining to calculating point based data
+		Add points to the power sums
+
+		:param array x: Array of values for the independent variable
+		:param array y: Array of values for the dependent variable
 		'''
 
-		D = {'stype':'wildtype'}
+		x = np.asarray(x,dtype=float)
+		y = np.asarray(y,dtype=float)
 
-		for a in range(len(self.acbins)):
-			if a+1 < len(self.acbins):
-				arange = [self.acbins[a],self.acbins[a+1]]
+		p = np.ones(len(x))
+		for k in range(2*self.deg+1):
+			self.sx[k] += p.sum()
+			if k <= self.deg:
+				self.sxy[k] += np.dot(p,y)
+			p *= x
 
-				for t in range(len(self.tbins)):
-					if t+1 < len(self.tbins):
-						trange = [self.tbins[t],self.tbins[t+1]]
+	def copy(self):
+		'''
+		:returns: New :py:class:`poly_sums` object with the same sums
+		'''
 
-						for p in self.percbins:
-							d = df[(df.ac > arange[0]) & (df.ac < arange[1])]
-							d = d[(d.theta > trange[0]) & (d.theta < trange[1])]
+		ps = poly_sums(self.deg)
+		ps.sx = self.sx.copy()
+		ps.sxy = self.sxy.copy()
+		return(ps)
 
-							try:
-								r = np.percentile(d.r,p)
-								pts = d[d.r < r].count()['i']
-							except:
-								r = self.rnull
-								pts = 0
+	def translate(self,dx,dy):
+		'''
+		Update the sums for points translated by subtracting `dx` from x and `dy` from y
 
-							L = []
-							for s in [arange[0],arange[1],trange[0],trange[1]]:
-								L.append(str(np.around(s,decimals=2)))
-							name = '_'.join(L)
+		:param float dx: Value subtracted from x
+		:param float dy: Value subtracted from y
+		'''
 
-							D[name+'_'+str(p)+'_pts-pts'] = pts
-							D[name+'_'+str(p)+'_perc-pts'] = pts
-							D[name+'_'+str(p)+'_pts-r'] = r
-							D[name+'_'+str(p)+'_perc-r'] = r
+		sx,sxy = np.zeros(len(self.sx)),np.zeros(len(self.sxy))
 
-		self.lm_wt_rf = self.lm_wt_rf.append(pd.Series(D,name=int(snum)))
+		#Expand (x-dx)**k with the binomial theorem
+		for k in range(len(self.sx)):
+			for j in range(k+1):
+				c = scipy.special.comb(k,j,exact=True)*(-dx)**(k-j)
+				sx[k] += c*self.sx[j]
+				if k < len(self.sxy):
+					sxy[k] += c*(self.sxy[j] - dy*self.sx[j])
 
-	def calc_mt_landmarks(self,df,snum,wt):
+		self.sx,self.sxy = sx,sxy
+
+	def scale(self,fx,fy):
 		'''
-		.. warning:: Deprecated function, but attempted to calculate mutant landmarks based on the number of points found in the wildtype standard
+		Update the sums for points where x is multiplied by `fx` and y by `fy`, e.g. -1 for a rotation of 180 degrees
+
+		:param float fx: Factor applied to x
+		:param float fy: Factor applied to y
 		'''
 
-		D = {'stype':'mutant'}
+		k = np.arange(len(self.sx))
+		self.sx = self.sx*fx**k
+		self.sxy = self.sxy*fx**k[:len(self.sxy)]*fy
 
-		for c in wt.columns:
-			if len(c.split('_')) == 6:
-				amn,amx,tmn,tmx,p,dtype = c.split('_')
-				p = int(p)
-
-				# print(c)
-				# print(df.count()['i'])
-				d = df[(df.ac > float(amn))&(df.ac < float(amx))]
-				# print(d.count()['i'])
-				d = d[(d.theta > float(tmn))&(d.theta < float(tmx))]
-				# print(d.count()['i'])
-
-				if dtype.split('-')[0] == 'perc':
-					try:
-						perc_r = np.percentile(d.r,p)
-						perc_pts = d[d.r < perc_r]
-					except:
-						perc_r = self.rnull
-						perc_pts = 0
-
-					if dtype.split('-')[1] == 'r':
-						D[c] = perc_r
-					else:
-						D[c] = perc_pts
-
-				else:
-					if dtype.split('-')[1] == 'pts':
-						#Calculate precent of points by dividing pts by total pts
-						p = wt[c].mean()/d.count()['i']
-						try:
-							pt_r = np.percentile(d.r,p)
-						except:
-							pt_r = self.rnull
-						D[c] = pt_r
-					else:
-						D[c] = np.nan
-
-		self.lm_mt_rf = self.lm_mt_rf.append(pd.Series(D,name=int(snum)))
+	def fit(self,deg=None):
+		'''
+		Solve the normal equations for the least squares polynomial
 
-def reformat_to_cart(df):
-	'''
-	Take a dataframe in which columns contain the bin parameters and convert to a cartesian coordinate system
+		:param int deg: (or None) Degree of the polynomial, which cannot be larger than :py:attr:`poly_sums.deg`
+		:returns: Array of coefficients with the highest power first, as returned by :py:func:`np.polyfit`
+		'''
 
-	:param pd.DataFrame df: Dataframe containing columns with string names that contain the bin parameter
-	:returns: pd.DataFrame with each landmark as a row and columns: x,y,z,r,r_std,t,pts
-	'''
+		if deg == None:
+			deg = self.deg
 
-	ndf = pd.DataFrame()
-	for c in df.columns:
-		if len(c.split('_')) == 6:
-			amn,amx,tmn,tmx,p,dtype = c.split('_')
-			x = np.mean([float(amn),float(amx)])
-			t = np.mean([float(tmn),float(tmx)])
+		#Solve around the mean of x to keep the normal equations well conditioned
+		mx = self.sx[1]/self.sx[0]
+		c = self.copy()
+		c.translate(mx,0)
+		s = np.sqrt(c.sx[2]/c.sx[0])
+		if s == 0:
+			s = 1.0
 
-			if dtype == 'r':
-				r = np.mean(df[c])
-				r_std = stats.sem(df[c])
-				y = np.sin(t)*r
-				z = np.cos(t)*r
+		k = np.arange(deg+1)
+		A = c.sx[k[:,np.newaxis]+k]/s**(k[:,np.newaxis]+k)
+		b = c.sxy[k]/s**k
+		cf = np.linalg.solve(A,b)/s**k
 
-				pts = np.mean(df['_'.join([amn,amx,tmn,tmx,p,'pts'])])
+		#Convert coefficients of (x-mx) to coefficients of x
+		p = np.poly1d(cf[::-1])(np.poly1d([1,-mx]))
+		return(np.concatenate([np.zeros(deg+1-len(p.c)),p.c]))
 
-				D = pd.Series({'x':x,'y':y,'z':z,'r':r,'r_sem':r_std,'t':t,'pts':pts})
+class AlignmentTransform:
+	'''
+	Object containing the 4x4 affine matrix that combines the PCA transformation, vertex translation and 180 degree rotation used to align a sample
 
-				ndf = ndf.append(pd.Series(D),ignore_index=True)
+	Each step is composed into :py:attr:`AlignmentTransform.matrix` so that the points of every channel are transformed with a single matrix multiplication
 
-	return(ndf)
+	:param array matrix: (or None) Array of shape (4,4) to start from, the identity matrix by default
 
-def convert_to_arr(xarr,tarr,mdf,Ldf=[]):
+	.. py:attribute:: AlignmentTransform.matrix
+
+		Array of shape (4,4) which transforms a column vector [x,y,z,1]
 	'''
-	Convert a pandas dataframe containing landmarks as columns and samples as rows into a 3D numpy array
 
-	The columns of `mdf` determine which landmarks will be saved into the array. Any additional dataframes that need to be converted can be included in Ldf
+	def __init__(self,matrix=None):
 
-	:param np.array xarr: Array containing all unique x values of landmarks in the dataset
-	:param np.array tarr: Array containing all unique t values of landmarks in the dataset
-	:param pd.DataFrame mdf: Main landmark dataframe containing landmarks as columns and samples as rows
-	:param list Ldf: List of additional pd.DataFrames that should also be converted to arrays
-	:returns: Array of the main dataframe and list of arrays converted from Ldf
-	'''
-	marr = np.zeros((len(xarr),len(tarr),len(mdf.index)))
-	xarr = np.round(xarr,2)
-	tarr = np.round(tarr,2)
-	Larr = []
-	for df in Ldf:
-		Larr.append(np.zeros((len(xarr),len(tarr),len(df.index))))
+		if matrix is None:
+			self.matrix = np.eye(4)
+		else:
+			self.matrix = np.array(matrix,dtype=float)
 
-	for c in mdf.columns:
-		if len(c.split('_')) == 6:
-			amn,amx,tmn,tmx,p,dtype = c.split('_')
-			x = float(amn)#np.mean([float(amn),float(amx)])
-			t = float(tmn) #np.mean([float(tmn),float(tmx)])
-	        
-			if dtype == 'r':
-				marr[np.where(xarr==x)[0],np.where(tarr==t)[0]] = mdf[c]
-				for arr,df in zip(Larr,Ldf):
-					arr[np.where(xarr==x)[0],np.where(tarr==t)[0]] = df[c]
-	                
-	return(marr,Larr)
+	def compose(self,m):
+		'''
+		Add a transformation that is applied after the current transformation
 
-def calc_variance(anum,dfs):
-	'''
-	Calculate the variance between samples according to bin position and variance between adjacent bins 
+		:param array m: Array of shape (4,4)
+		'''
 
-	:param int anum: Number of bins which the arclength axis should be divided into
-	:param dict dfs: Dictionary of dfs which are going to be processed
-	:returns: Two arrays: svar (anum,tnum) and bvar (anum*tnum,snum)
-	:rtype: np.array 
-	'''
+		self.matrix = np.dot(m,self.matrix)
 
-	#Set up bins
-	lm = landmarks(percbins=[50],rnull=15)
-	lm.calc_bins(dfs.values(),anum,np.pi/4)
+	def add_pca(self,pca,comp_order,twoD=False):
+		'''
+		Add the transformation calculated by a PCA object
 
-	 #Calculate landmarks
-	outlm = pd.DataFrame()
-	for k in dfs.keys():
-		outlm = lm.calc_perc(dfs[k],k,'wt',outlm)
-	    
-	#Convert to arr for variance calculation
-	lmarr,arr = convert_to_arr(lm.acbins,lm.tbins,outlm)
+		:param pca_object pca: A pca object containing a transformation object, e.g. :py:attr:`brain.pcamed`
+		:param array comp_order: Array specifies the assignment of components to x,y,z. Form [x component index, y component index, z component index], e.g. [0,2,1]
+		:param bool twoD: (or None) Set to True if `pca` was fit to y and z only, in which case x is unchanged
+		'''
 
-	svar = np.var(lmarr,axis=2)
+		R = np.eye(3)
+		mean = np.zeros(3)
+		if twoD == True:
+			R[1,1:] = pca.components_[comp_order[1]-1]
+			R[2,1:] = pca.components_[comp_order[2]-1]
+			mean[1:] = pca.mean_
+		else:
+			R = pca.components_[comp_order]
+			mean = pca.mean_
 
-	Lvar = []
-	for i in range(1,len(lm.acbins)-2):
-		for t in range(0,len(lm.tbins)):
-			#Save the variance of a particular bin and adjacent neighbors across a set of samples
-			Lvar.append(np.var(lmarr[i-1:i+2,t],axis=0))
-	        
-	return(svar,np.array(Lvar))
+		m = np.eye(4)
+		m[:3,:3] = R
+		m[:3,3] = -np.dot(R,mean)
+		self.compose(m)
 
-class anumSelect:
+	def translate(self,v):
+		'''
+		Add a translation that moves the point `v` to the origin
 
-	def __init__(self,dfs):
+		:param array v: Array of type [vx,vy,vz], e.g. :py:attr:`brain.vertex`
 		'''
-		A class that assists in selecting the optimum value of anum
 
-		:param dict dfs: Dictionary of pd.DataFrames with samples to use for optimization
-		
-		.. attribute:: anumSelect.dfs
+		m = np.eye(4)
+		m[:3,3] = -np.array(v,dtype=float)
+		self.compose(m)
 
-			Dictionary of dataframes that will be used for the parameter sweep
+	def flip(self):
+		'''
+		Add a rotation of 180 degrees around the y axis, equivalent to :py:func:`brain.flip_data`
+		'''
 
-		.. attribute:: anumSelect.Lsv
+		self.compose(np.diag([-1.0,1.0,-1.0,1.0]))
 
-			List of sample variance arrays for each anum in the sweep
+	def apply(self,X):
+		'''
+		Transform points with a single matrix multiplication. The translation is added in place to the result, which becomes the data of the returned dataframe without another copy
 
-		.. attribute:: anumSelect.Lbv
+		:param array X: Array or dataframe of shape (n,3) containing x,y,z
+		:returns: pd.DataFrame with columns x,y,z
+		'''
 
-			List of bin variance arrays for each anum in the sweep
+		X = np.asarray(X,dtype=float)
+		out = np.dot(X,self.matrix[:3,:3].T)
+		out += self.matrix[:3,3]
 
-		.. attribute:: anumSelect.Msv
+		return(pd.DataFrame(out,columns=['x','y','z']))
 
-			List of values of the average sample variance for each anum in the sweep
+def bin_axis(values,bins):
+	'''
+	Assign each value to a bin with :py:func:`np.digitize`, excluding values outside of the bins or exactly on a boundary
 
-		.. attribute:: anumSelect.Mbv
+	:param array values: Array of values
+	:param array bins: Array containing the boundaries of each bin
+	:returns: Array of bin indices with -1 for values that are not assigned
+	'''
 
-			List of values of the average bin variance for each anum in the sweep
+	values = np.asarray(values,dtype=float)
+	bins = np.asarray(bins,dtype=float)
 
-		.. attribute:: anumSelect.Llm
+	i = np.digitize(values,bins)-1
 
-			List of landmark arrays for each anum in the sweep
+	#Remove values outside of the bins or on the lower boundary of a bin
+	valid = (i >= 0) & (i < len(bins)-1)
+	valid[valid] = values[valid] != bins[i[valid]]
+	i[~valid] = -1
 
-		'''
+	return(i)
+
+def bin_points(ac,theta,acbins,tbins):
+	'''
+	Assign each point to an alpha and theta bin with :py:func:`np.digitize`
+
+	Points must fall strictly between the boundaries of a bin, so points outside of the bins or exactly on a boundary are not assigned, matching the filters used by :py:func:`landmarks.calc_perc`
+
+	:param array ac: Array of alpha values
+	:param array theta: Array of theta values
+	:param array acbins: Array containing the boundaries of each bin along alpha
+	:param array tbins: Array containing the boundaries of each bin along theta
+	:returns: Array of bin keys, a*(len(tbins)-1)+t, with -1 for points that are not assigned
+	'''
+
+	ia = bin_axis(ac,acbins)
+	it = bin_axis(theta,tbins)
+
+	key = ia*(len(tbins)-1) + it
+	key[(ia < 0) | (it < 0)] = -1
+	return(key)
+
+def sort_segments(r,key,nseg):
+	'''
+	Sort r by bin key and then by value so that each bin is a contiguous, sorted segment
+
+	:param array r: Array of r values
+	:param array key: Array of bin keys from :py:func:`bin_points`
+	:param int nseg: Total number of bins
+	:returns: Sorted array of r, and arrays with the start index and number of points of each bin
+	'''
+
+	r = np.asarray(r,dtype=float)
+	keep = key >= 0
+	r,key = r[keep],key[keep]
+
+	order = np.lexsort((r,key))
+	counts = np.bincount(key,minlength=nseg)
+	starts = np.cumsum(counts)-counts
+
+	return(r[order],starts,counts)
+
+def segment_percentiles(rs,starts,counts,percbins,rnull):
+	'''
+	Calculate percentiles of r and the number of points below each percentile for every bin at once
+
+	Percentiles are interpolated in the same way as :py:func:`np.percentile` and bins without any points are set to `rnull`
+
+	:param array rs: Array of r sorted within each bin from :py:func:`sort_segments`
+	:param array starts: Array containing the start index of each bin in `rs`
+	:param array counts: Array containing the number of points in each bin
+	:param list percbins: List of integers between 0 and 100
+	:param int rnull: Value assigned to r when the percentile cannot be calculated
+	:returns: Array of shape (bins,percentiles,2) containing r and pts
+	'''
+
+	out = np.zeros((len(counts),len(percbins),2))
+	full = counts > 0
+	st,n = starts[full],counts[full]
+
+	for i,p in enumerate(percbins):
+		r = segment_interp(rs,st,n,np.full(len(n),p,dtype=float))
+
+		out[full,i,0] = r
+		out[full,i,1] = segment_count_below(rs,st,st+n,r)-st
+
+	out[~full,:,0] = rnull
+	return(out)
+
+def segment_interp(rs,st,n,p):
+	'''
+	Calculate a different percentile for each sorted segment, interpolated in the same way as :py:func:`np.percentile`
+
+	:param array rs: Array of r sorted within each bin from :py:func:`sort_segments`
+	:param array st: Array containing the start index of each segment, which must not be empty
+	:param array n: Array containing the number of points in each segment
+	:param array p: Array containing a percentile between 0 and 100 for each segment
+	:returns: Array of r values
+	'''
+
+	#Find neighboring values and interpolation weight as in np.percentile
+	vi = (n-1)*(p/100)
+	prev = np.floor(vi).astype(int)
+	nxt = prev+1
+	above = vi >= n-1
+	prev[above] = n[above]-1
+	nxt[above] = n[above]-1
+	gamma = vi-prev
+
+	a,b = rs[st+prev],rs[st+nxt]
+	diff = b-a
+	r = a+diff*gamma
+	hi = gamma >= 0.5
+	r[hi] = b[hi]-diff[hi]*(1-gamma[hi])
+
+	return(r)
+
+def segment_count_below(rs,lo,hi,v):
+	'''
+	Vectorized binary search for the first index in each sorted segment rs[lo:hi] with a value that is not less than v
+
+	:param array rs: Array that is sorted within each segment
+	:param array lo: Array of start indices of each segment
+	:param array hi: Array of end indices of each segment
+	:param array v: Array of values to search for in each segment
+	:returns: Array of indices into `rs`
+	'''
+
+	lo,hi = lo.copy(),hi.copy()
+	while np.any(lo < hi):
+		active = lo < hi
+		mid = (lo+hi)//2
+		less = np.zeros(len(mid),dtype=bool)
+		less[active] = rs[mid[active]] < v[active]
+		lo = np.where(active & less,mid+1,lo)
+		hi = np.where(active & ~less,mid,hi)
+
+	return(lo)
+
+def landmark_array(ac,theta,r,acbins,tbins,percbins,rnull):
+	'''
+	Calculate landmarks for a set of points in a single pass using :py:func:`bin_points`, :py:func:`sort_segments` and :py:func:`segment_percentiles`
+
+	:param np.array ac: Array of alpha values
+	:param np.array theta: Array of theta values
+	:param np.array r: Array of r values
+	:param array acbins: Array containing the boundaries of each bin along alpha
+	:param array tbins: Array containing the boundaries of each bin along theta
+	:param list percbins: List of integers between 0 and 100
+	:param int rnull: Value assigned to r when the percentile cannot be calculated
+	:returns: Array of shape (len(acbins)-1,len(tbins)-1,len(percbins),2) containing r and pts for each landmark
+	'''
+
+	na,nt = len(acbins)-1,len(tbins)-1
+
+	key = bin_points(ac,theta,acbins,tbins)
+	rs,starts,counts = sort_segments(r,key,na*nt)
+	arr = segment_percentiles(rs,starts,counts,percbins,rnull)
+
+	return(arr.reshape(na,nt,len(percbins),2))
+
+#Memory mapped points and bins shared with landmark_worker in each process of landmarks.calc_all
+landmark_state = {}
+
+def init_landmark_worker(path,n,acbins,tbins,percbins,rnull):
+	'''
+	Open the memory mapped points written by :py:func:`landmarks.calc_all` in a worker process
+
+	:param str path: Complete filepath to the memory mapped array of shape (3,n) containing alpha, theta and r
+	:param int n: Total number of points
+	:param array acbins: Array containing the boundaries of each bin along alpha
+	:param array tbins: Array containing the boundaries of each bin along theta
+	:param list percbins: List of integers between 0 and 100
+	:param int rnull: Value assigned to r when the percentile cannot be calculated
+	'''
+
+	landmark_state.update({'pts':np.memmap(path,dtype=float,mode='r',shape=(3,n)),
+		'acbins':acbins,'tbins':tbins,'percbins':percbins,'rnull':rnull})
+
+def landmark_worker(span):
+	'''
+	Calculate landmarks for the points of one sample in the memory mapped array opened by :py:func:`init_landmark_worker`
+
+	:param tuple span: Index of the first point and the index after the last point of the sample
+	:returns: Array of landmarks from :py:func:`landmark_array`
+	'''
+
+	S = landmark_state
+	ac,theta,r = S['pts'][:,span[0]:span[1]]
+
+	return(landmark_array(ac,theta,r,S['acbins'],S['tbins'],S['percbins'],S['rnull']))
+
+class landmark_cache:
+	'''
+	Disk cache of landmark arrays identified by the content of a sample and the parameters of the calculation
+
+	Each entry is saved as a .npy file named by a sha1 hash of the alpha, theta and r values of the sample and the bins, percentiles and rnull used to calculate the landmarks. Samples that have not changed are not recalculated when the same psi files are analyzed again.
+
+	:param str directory: Directory where cached arrays are saved, which is created if it does not exist
+	:param int max_bytes: (or None) Maximum total size of the cache in bytes. The least recently used entries are deleted when it is exceeded. No limit by default
+	'''
+
+	def __init__(self,directory,max_bytes=None):
+
+		self.directory = directory
+		self.max_bytes = max_bytes
+
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+	def key(self,ac,theta,r,acbins,tbins,percbins,rnull):
+		'''
+		Calculate the key of a sample from its points and the parameters of the calculation
+
+		:param np.array ac: Array of alpha values
+		:param np.array theta: Array of theta values
+		:param np.array r: Array of r values
+		:param array acbins: Array containing the boundaries of each bin along alpha
+		:param array tbins: Array containing the boundaries of each bin along theta
+		:param list percbins: List of integers between 0 and 100
+		:param int rnull: Value assigned to r when the percentile cannot be calculated
+		:returns: String containing the hex digest of the hash
+		'''
+
+		h = hashlib.sha1()
+		for a in [ac,theta,r,acbins,tbins,percbins,[rnull]]:
+			a = np.ascontiguousarray(a,dtype=float)
+			h.update(str(a.shape).encode())
+			h.update(a.data)
+
+		return(h.hexdigest())
+
+	def path(self,key):
+		'''
+		:param str key: Key from :py:func:`landmark_cache.key`
+		:returns: Complete filepath to the cached array
+		'''
+
+		return(os.path.join(self.directory,key+'.npy'))
+
+	def get(self,key):
+		'''
+		Load a cached array and mark it as recently used
+
+		:param str key: Key from :py:func:`landmark_cache.key`
+		:returns: Array of landmarks or None if the key is not in the cache
+		'''
+
+		path = self.path(key)
+		try:
+			arr = np.load(path)
+			os.utime(path)
+		except (IOError,OSError,ValueError):
+			return(None)
+
+		return(arr)
+
+	def put(self,key,arr):
+		'''
+		Save an array in the cache and delete the least recently used entries if the cache is larger than :py:attr:`landmark_cache.max_bytes`
+
+		:param str key: Key from :py:func:`landmark_cache.key`
+		:param np.array arr: Array of landmarks
+		'''
+
+		#Write to a temporary file first so that other processes never read a partial array
+		tmp = self.path(key)+'.'+str(os.getpid())+'.tmp'
+		with open(tmp,'wb') as f:
+			np.save(f,arr)
+		os.replace(tmp,self.path(key))
+
+		self.evict()
+
+	def evict(self):
+		'''
+		Delete the least recently used entries until the cache is smaller than :py:attr:`landmark_cache.max_bytes`
+		'''
+
+		if self.max_bytes == None:
+			return
+
+		entries = []
+		for f in os.listdir(self.directory):
+			if f.endswith('.npy'):
+				st = os.stat(os.path.join(self.directory,f))
+				entries.append((st.st_mtime,st.st_size,f))
+
+		total = sum([e[1] for e in entries])
+		for mtime,size,f in sorted(entries):
+			if total <= self.max_bytes:
+				break
+			try:
+				os.remove(os.path.join(self.directory,f))
+			except OSError:
+				pass
+			total -= size
+
+	def clear(self):
+		'''
+		Delete every entry in the cache
+		'''
+
+		for f in os.listdir(self.directory):
+			if f.endswith('.npy'):
+				os.remove(os.path.join(self.directory,f))
+
+class landmarks:
+	'''
+	Class to handle calculation of landmarks to describe structural data
+
+	:param list percbins: (or None) Must be a list of integers between 0 and 100 
+	:param int rnull: (or None) When the r value cannot be calculated it will be set to this value
+	:param landmark_cache cache: (or None) Cache used to save and reuse the landmarks of each sample
+	
+	.. py:attribute:: brain.lm_wt_rf
+
+		pd.DataFrame, which wildtype landmarks will be added to. Rows are collected in :py:attr:`landmarks.wt_rows` and combined into a dataframe when the attribute is accessed
+
+	.. py:attribute:: brain.lm_mt_rf
+
+		pd.DataFrame, which mutant landmarks will be added to. Rows are collected in :py:attr:`landmarks.mt_rows` and combined into a dataframe when the attribute is accessed
+
+	.. py:attribute:: brain.rnull
+
+		Integer specifying the value which null landmark calculations will be set to
+	
+	.. py:attribute:: brain.percbins
+
+		Integer specifying the percentiles which will be used to calculate landmarks
+	'''
+
+	def __init__(self,percbins=[10,50,90],rnull=15,cache=None):
+
+		self.wt_rows = []
+		self.mt_rows = []
+		self.rf_cache = {}
+
+		self.rnull = rnull
+		self.percbins = percbins
+		self.cache = cache
+
+	def combine_rows(self,key,rows):
+		'''
+		Combine a list of pd.Series into a single dataframe, which is only recreated when rows have been added
+
+		:param str key: Name used to cache the dataframe
+		:param list rows: List of pd.Series named with the sample number
+		:returns: pd.DataFrame with a row for each series
+		'''
+
+		if key not in self.rf_cache or len(self.rf_cache[key].index) != len(rows):
+			self.rf_cache[key] = pd.DataFrame(rows)
+
+		return(self.rf_cache[key])
+
+	@property
+	def lm_wt_rf(self):
+		return(self.combine_rows('wt',self.wt_rows))
+
+	@property
+	def lm_mt_rf(self):
+		return(self.combine_rows('mt',self.mt_rows))
+
+	def calc_bins(self,Ldf,ac_num,tstep):
+		'''
+		Calculates alpha and theta bins based on ac_num and tstep
+
+		Creates :py:attr:`landmarks.acbins` and :py:attr:`landmarks.tbins`
+
+		.. warning:: `tstep` does not handle scenarios where 2pi is not evenly divisible by tstep
+
+		:param list Ldf: List of dataframes or summaries from :py:func:`read_summary_dict` that are being used for the analysis typically accessed by `dict.values()`
+		:param int ac_num: Integer indicating the number of divisions that should be made along alpha
+		:param float tstep: The size of each bin used for alpha
+
+		.. py:attribute:: landmarks.acbins
+
+			List containing the boundaries of each bin along alpha based on `ac_num`
+
+		.. py:attribute:: landmarks.tbins
+
+			List containing the boundaries of each bin along theta based on `tstep`
+		'''
+
+		#Find the minimum and maximum values of alpha in the dataset
+		acmin,acmax = ac_range(Ldf)
+
+		self.acbins = calc_acbins(acmin,acmax,ac_num)
+
+		#Calculate tbins divisions based on tstep
+		self.tbins = np.arange(-np.pi,np.pi+tstep,tstep)
+
+	def calc_perc_array(self,df):
+		'''
+		Calculate landmarks for a dataframe in a single pass over the points
+
+		Points are assigned to bins once with :py:func:`bin_points` and sorted by bin and r, so that every percentile and point count is read from the sorted segments (:py:func:`segment_percentiles`) instead of filtering the dataframe for each bin and percentile
+
+		:param pd.DataFrame df: Dataframe containing columns x,y,z,alpha,r,theta
+		:returns: Array of shape (len(acbins)-1,len(tbins)-1,len(percbins),2) containing r and pts for each landmark
+		'''
+
+		key,arr = self.cache_lookup(df)
+
+		if arr is None:
+			arr = landmark_array(df.ac.values,df.theta.values,df.r.values,
+				self.acbins,self.tbins,self.percbins,self.rnull)
+			if key != None:
+				self.cache.put(key,arr)
+
+		return(arr)
+
+	def cache_lookup(self,df):
+		'''
+		Look up the landmarks of a sample in :py:attr:`landmarks.cache`
+
+		:param pd.DataFrame df: Dataframe containing columns alpha,r,theta
+		:returns: Key of the sample and the cached array, the array is None if it is not cached and both are None without a cache
+		'''
+
+		if self.cache == None:
+			return(None,None)
+
+		key = self.cache.key(df.ac.values,df.theta.values,df.r.values,
+			self.acbins,self.tbins,self.percbins,self.rnull)
+		return(key,self.cache.get(key))
+
+	def bin_name(self,a,t):
+		'''
+		Create the name that identifies a landmark bin in column names using :py:func:`lmk_name`
+
+		:param int a: Index of the bin along alpha
+		:param int t: Index of the bin along theta
+		:returns: String containing the rounded boundaries of the bin, e.g. '-12.3_-10.1_-3.14_-2.36'
+		'''
+
+		return(lmk_name(self.acbins,self.tbins,a,t))
+
+	def calc_tensor(self,dfs,dtype):
+		'''
+		Calculate landmarks for a dictionary of samples and store them in a :py:class:`landmark_tensor`
+
+		:param dict dfs: Dictionary of pd.DataFrames containing columns x,y,z,alpha,r,theta with sample identifiers as keys
+		:param str dtype: String describing the sample group to which the samples belong, e.g. control or experimental
+		:returns: :py:class:`landmark_tensor` with the landmarks of every sample
+		'''
+
+		arr = np.array([self.calc_perc_array(dfs[k]) for k in dfs.keys()])
+
+		return(landmark_tensor(arr,list(dfs.keys()),[dtype]*len(dfs),
+			self.acbins,self.tbins,self.percbins))
+
+	def calc_sketch(self,df,accuracy=0.01):
+		'''
+		Create a :py:class:`landmark_sketch` with the bins of this object and add the points of a dataframe
+
+		:param pd.DataFrame df: (or None) Dataframe containing columns ac,r,theta, an empty sketch is returned if None
+		:param float accuracy: (or None) Relative accuracy of the estimated r values
+		:returns: :py:class:`landmark_sketch`
+		'''
+
+		sk = landmark_sketch(self.acbins,self.tbins,accuracy)
+		if df is not None:
+			sk.add_df(df)
+		return(sk)
+
+	def sketch_psi(self,filepath,accuracy=0.01,chunksize=100000):
+		'''
+		Create a :py:class:`landmark_sketch` from a psi file that is read in chunks with :py:func:`read_psi_chunks` so that the whole sample is never in memory
+
+		:param str filepath: Complete filepath to psi file
+		:param float accuracy: (or None) Relative accuracy of the estimated r values
+		:param int chunksize: (or None) Number of points read at a time
+		:returns: :py:class:`landmark_sketch`
+		'''
+
+		sk = self.calc_sketch(None,accuracy)
+		for chunk in read_psi_chunks(filepath,chunksize,columns=['ac','r','theta']):
+			sk.add_df(chunk)
+		return(sk)
+
+	def sketch_tensor(self,sketches,dtype):
+		'''
+		Estimate landmarks from a dictionary of sketches and store them in a :py:class:`landmark_tensor`
+
+		Use :py:func:`merge_sketches` to combine the sketches of a group into a single entry
+
+		:param dict sketches: Dictionary of :py:class:`landmark_sketch` with sample identifiers as keys
+		:param str dtype: String describing the sample group to which the samples belong
+		:returns: :py:class:`landmark_tensor`
+		'''
+
+		arr = np.array([sketches[k].calc_array(self.percbins,self.rnull) for k in sketches.keys()])
+
+		return(landmark_tensor(arr,list(sketches.keys()),[dtype]*len(sketches),
+			self.acbins,self.tbins,self.percbins))
+
+	def calc_all(self,dfs,dtype,n_jobs=None):
+		'''
+		Calculate landmarks for a dictionary of samples in a pool of processes and store them in a :py:class:`landmark_tensor`
+
+		The alpha, theta and r values of every sample are written once to a memory mapped file that each process opens with :py:func:`init_landmark_worker`, so the points are not copied to the processes with each task. Samples found in :py:attr:`landmarks.cache` are not recalculated
+
+		:param dict dfs: Dictionary of pd.DataFrames containing columns alpha,r,theta with sample identifiers as keys
+		:param str dtype: String describing the sample group to which the samples belong, e.g. control or experimental
+		:param int n_jobs: (or None) Number of processes, the number of cpus by default. Samples are calculated in this process if n_jobs is 1
+		:returns: :py:class:`landmark_tensor` with the landmarks of every sample in the order of `dfs`
+		'''
+
+		keys = list(dfs.keys())
+
+		#Only calculate samples that are not in the cache
+		found = dict((k,self.cache_lookup(dfs[k])) for k in keys)
+		todo = [k for k in keys if found[k][1] is None]
+
+		if n_jobs == 1 or len(todo) < 2:
+			results = [landmark_array(dfs[k].ac.values,dfs[k].theta.values,dfs[k].r.values,
+				self.acbins,self.tbins,self.percbins,self.rnull) for k in todo]
+		else:
+			results = self.pool_arrays([dfs[k] for k in todo],n_jobs)
+
+		for k,arr in zip(todo,results):
+			if found[k][0] != None:
+				self.cache.put(found[k][0],arr)
+
+		arrays = dict((k,found[k][1]) for k in keys)
+		arrays.update(zip(todo,results))
+		arr = np.array([arrays[k] for k in keys])
+
+		return(landmark_tensor(arr,keys,[dtype]*len(keys),
+			self.acbins,self.tbins,self.percbins))
+
+	def pool_arrays(self,Ldf,n_jobs):
+		'''
+		Calculate the landmark arrays of a list of samples in a pool of processes
+
+		The alpha, theta and r values of every sample are written once to a memory mapped file that each process opens with :py:func:`init_landmark_worker`
+
+		:param list Ldf: List of pd.DataFrames containing columns alpha,r,theta
+		:param int n_jobs: (or None) Number of processes, the number of cpus by default
+		:returns: List of arrays from :py:func:`landmark_array` in the order of `Ldf`
+		'''
+
+		stops = np.cumsum([len(df.index) for df in Ldf])
+		starts = stops - [len(df.index) for df in Ldf]
+
+		tmpdir = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tmpdir,'points.dat')
+			pts = np.memmap(path,dtype=float,mode='w+',shape=(3,int(stops[-1])))
+			for df,i,j in zip(Ldf,starts,stops):
+				pts[:,i:j] = df[['ac','theta','r']].values.T
+			pts.flush()
+			del pts
+
+			#Stop the processes before the memory mapped file is removed, even if a sample fails
+			pool = mp.Pool(n_jobs,initializer=init_landmark_worker,
+				initargs=(path,int(stops[-1]),self.acbins,self.tbins,self.percbins,self.rnull))
+			try:
+				results = pool.map(landmark_worker,zip(starts,stops))
+			finally:
+				pool.terminate()
+				pool.join()
+		finally:
+			shutil.rmtree(tmpdir,ignore_errors=True)
+
+		return(results)
+
+	def calc_stats(self,dfs,ls=None):
+		'''
+		Add the landmarks of each sample to a :py:class:`landmark_stats` accumulator as soon as they are calculated, so only one sample is kept in memory when `dfs` reads samples on demand
+
+		:param dfs: Dictionary or iterable of pd.DataFrames containing columns alpha,r,theta
+		:param landmark_stats ls: (or None) Accumulator to add the samples to, a new accumulator is created by default
+		:returns: :py:class:`landmark_stats`
+		'''
+
+		if ls == None:
+			ls = landmark_stats(self.acbins,self.tbins,self.percbins)
+
+		if isinstance(dfs,Mapping):
+			dfs = dfs.values()
+
+		for df in dfs:
+			ls.add(self.calc_perc_array(df))
+
+		return(ls)
+
+	def calc_perc(self,df,snum,dtype,out):
+		'''
+		Calculate landmarks for a dataframe based on the bins and percentiles that have been previously defined 
+
+		.. note:: Use :py:func:`landmarks.calc_tensor` to calculate many samples, which returns the same landmarks as an array and creates the dataframe once with :py:func:`landmark_tensor.to_dataframe`. Otherwise pass a list as `out` and combine the rows once with :py:func:`pd.concat`
+
+		.. warning:: Passing a dataframe with rows as `out` is deprecated. Each call copies the dataframe, so adding samples one at a time takes quadratic time
+
+		:param pd.DataFrame df: Dataframe containing columns x,y,z,alpha,r,theta
+		:param str snum: String containing a sample identifier that can be converted to an integer
+		:param str dtype: String describing the sample group to which the sample belongs, e.g. control or experimental
+		:param out: List or (deprecated) dataframe that the landmarks of this sample will be added to
+		:type: pd.DataFrame or list
+		:returns: pd.DataFrame with new landmarks appended or list with a new single row dataframe
+		'''
+
+		lt = self.calc_tensor({snum:df},dtype)
+
+		if type(out) == list:
+			out.append(lt.to_dataframe())
+		elif len(out.index) == 0:
+			out = lt.to_dataframe()
+		else:
+			warnings.warn('Adding landmarks to a dataframe with calc_perc copies the dataframe for every sample. Use landmarks.calc_tensor or pass a list as out',DeprecationWarning,stacklevel=2)
+			out = pd.concat([out,lt.to_dataframe()])
+		return(out)
+
+	def calc_wt_reformat(self,df,snum):
+		'''
+		.. warning:: Deprecated function, but includes code pertaining to calculating point based data
+		'''
+
+		D = {'stype':'wildtype'}
+
+		arr = self.calc_perc_array(df)
+
+		for a in range(arr.shape[0]):
+			for t in range(arr.shape[1]):
+				name = self.bin_name(a,t)
+				for i,p in enumerate(self.percbins):
+					r,pts = arr[a,t,i,0],int(arr[a,t,i,1])
+
+					D[name+'_'+str(p)+'_pts-pts'] = pts
+					D[name+'_'+str(p)+'_perc-pts'] = pts
+					D[name+'_'+str(p)+'_pts-r'] = r
+					D[name+'_'+str(p)+'_perc-r'] = r
+
+		self.wt_rows.append(pd.Series(D,name=int(snum)))
+
+	def calc_mt_landmarks(self,df,snum,wt):
+		'''
+		.. warning:: Deprecated function, but attempted to calculate mutant landmarks based on the number of points found in the wildtype standard
+
+		The layout of the wildtype columns is parsed once with :py:func:`parse_lmk_columns` and the mutant points are assigned to bins in a single pass
+
+		:param pd.DataFrame df: Dataframe containing columns alpha,r,theta
+		:param str snum: String containing a sample identifier that can be converted to an integer
+		:param pd.DataFrame wt: Wildtype landmarks created by :py:func:`landmarks.calc_wt_reformat`
+		'''
+
+		#Parse the bins and landmark types of the wildtype columns once
+		meta = parse_lmk_columns(wt.columns)
+		aedges = np.unique(np.concatenate([meta.amn,meta.amx]))
+		tedges = np.unique(np.concatenate([meta.tmn,meta.tmx]))
+		nt = len(tedges)-1
+		seg = (np.searchsorted(aedges,meta.amn.values)*nt + np.searchsorted(tedges,meta.tmn.values))
+
+		#Sort mutant points into bins in a single pass
+		key = bin_points(df.ac.values,df.theta.values,aedges,tedges)
+		rs,starts,counts = sort_segments(df.r.values,key,(len(aedges)-1)*nt)
+
+		vals = np.full(len(meta.index),np.nan)
+
+		#Landmarks at the percentile of the column
+		perc = (meta.kind == 'perc').values
+		for p in np.unique(meta.p[perc]):
+			cols = perc & (meta.p == p).values
+			arr = segment_percentiles(rs,starts,counts,[p],self.rnull)[seg[cols],0]
+			vals[cols] = np.where(meta.measure[cols] == 'r',arr[:,0],arr[:,1])
+
+		#Landmarks at the percentile with the same number of points as the wildtype average
+		cols = ((meta.kind != 'perc') & (meta.measure == 'pts')).values
+		n = counts[seg[cols]]
+		with np.errstate(divide='ignore',invalid='ignore'):
+			q = 100*wt[meta.index[cols]].mean().values/n
+		valid = (n > 0) & (q >= 0) & (q <= 100)
+
+		pt_r = np.full(len(n),float(self.rnull))
+		pt_r[valid] = segment_interp(rs,starts[seg[cols]][valid],n[valid],q[valid])
+		vals[cols] = pt_r
+
+		D = {'stype':'mutant'}
+		D.update(zip(meta.index,vals))
+
+		self.mt_rows.append(pd.Series(D,name=int(snum)))
+
+def ac_range(Ldf):
+	'''
+	Find the minimum and maximum values of alpha in a set of samples, including zero
+
+	:param list Ldf: List of dataframes or summaries from :py:func:`psi_summary` that are being used for the analysis typically accessed by `dict.values()`
+	:returns: Minimum and maximum value of alpha
+	'''
+
+	acmin,acmax = 0,0
+	for df in Ldf:
+		if type(df) == dict:
+			dmin,dmax = df['ac']
+		else:
+			dmin,dmax = df.ac.min(),df.ac.max()
+
+		if dmin < acmin:
+			acmin = dmin
+		if dmax > acmax:
+			acmax = dmax
+
+	return(acmin,acmax)
+
+def calc_acbins(acmin,acmax,ac_num):
+	'''
+	Calculate the boundaries of bins along alpha so that arclength is equal on each side of the vertex
+
+	:param float acmin: Minimum value of alpha
+	:param float acmax: Maximum value of alpha
+	:param int ac_num: Integer indicating the number of divisions that should be made along alpha
+	:returns: Array containing the boundaries of each bin along alpha
+	'''
+
+	#Correct min and max values so that arclength is equal on each side
+	if abs(acmin) > acmax:
+		return(np.linspace(acmin,abs(acmin),ac_num))
+	else:
+		return(np.linspace(-acmax,acmax,ac_num))
+
+def lmk_name(acbins,tbins,a,t):
+	'''
+	Create the name that identifies a landmark bin in column names
+
+	:param array acbins: Array containing the boundaries of each bin along alpha
+	:param array tbins: Array containing the boundaries of each bin along theta
+	:param int a: Index of the bin along alpha
+	:param int t: Index of the bin along theta
+	:returns: String containing the rounded boundaries of the bin, e.g. '-12.3_-10.1_-3.14_-2.36'
+	'''
+
+	L = []
+	for s in [acbins[a],acbins[a+1],tbins[t],tbins[t+1]]:
+		L.append(str(np.around(s,decimals=2)))
+	return('_'.join(L))
+
+def lmk_centers(bins):
+	'''
+	Calculate the center of each bin from the boundaries rounded as in :py:func:`lmk_name`, so that centers match those parsed from column names
+
+	:param array bins: Array containing the boundaries of each bin
+	:returns: Array containing the center of each bin
+	'''
+
+	b = np.around(np.asarray(bins,dtype=float),decimals=2)
+	return((b[:-1]+b[1:])/2)
+
+def parse_lmk_columns(columns):
+	'''
+	Parse landmark column names, e.g. '-12.3_-10.1_-3.14_-2.36_50_perc-r', into the bins and type of each landmark
+
+	:param list columns: List of column names, columns that do not describe a landmark are skipped
+	:returns: pd.DataFrame indexed by column name with columns amn,amx,tmn,tmx,p and the two parts of the landmark type, kind and measure
+	'''
+
+	rows = []
+	for c in columns:
+		if len(c.split('_')) == 6:
+			amn,amx,tmn,tmx,p,dtype = c.split('_')
+			kind,measure = (dtype.split('-')+[''])[:2]
+			rows.append([c,float(amn),float(amx),float(tmn),float(tmx),int(p),kind,measure])
+
+	return(pd.DataFrame(rows,columns=['name','amn','amx','tmn','tmx','p','kind','measure']).set_index('name'))
+
+class landmark_tensor:
+	'''
+	Object containing the landmarks of a set of samples as a single array with the bins that describe each axis
+
+	:param array arr: Array of shape (samples,alpha bins,theta bins,percentiles,2)
+	:param list snums: List of sample identifiers in the order of the first axis of `arr`
+	:param list stypes: List of strings describing the sample group of each sample
+	:param array acbins: Array containing the boundaries of each bin along alpha
+	:param array tbins: Array containing the boundaries of each bin along theta
+	:param list percbins: List of integers between 0 and 100 for each percentile
+
+	.. py:attribute:: landmark_tensor.arr
+
+		Array of shape (samples,alpha bins,theta bins,percentiles,2) where the last axis contains r and pts
+
+	.. py:attribute:: landmark_tensor.x
+
+		Array containing the center of each alpha bin (:py:func:`lmk_centers`)
+
+	.. py:attribute:: landmark_tensor.t
+
+		Array containing the center of each theta bin (:py:func:`lmk_centers`)
+	'''
+
+	def __init__(self,arr,snums,stypes,acbins,tbins,percbins):
+
+		self.arr = arr
+		self.snums = list(snums)
+		self.stypes = list(stypes)
+		self.acbins = np.asarray(acbins)
+		self.tbins = np.asarray(tbins)
+		self.percbins = list(percbins)
+
+		self.x = lmk_centers(self.acbins)
+		self.t = lmk_centers(self.tbins)
+
+	def r(self):
+		'''
+		:returns: Array of shape (samples,alpha bins,theta bins,percentiles) containing r
+		'''
+
+		return(self.arr[...,0])
+
+	def pts(self):
+		'''
+		:returns: Array of shape (samples,alpha bins,theta bins,percentiles) containing the number of points below r
+		'''
+
+		return(self.arr[...,1])
+
+	def grid(self,perc=-1,var='r'):
+		'''
+		Create an array with a row for each value of :py:attr:`landmark_tensor.acbins` and a column for each value of :py:attr:`landmark_tensor.tbins`, which is the layout created by :py:func:`convert_to_arr`
+
+		:param int perc: (or None) Index of the percentile in :py:attr:`landmark_tensor.percbins`, the last percentile by default
+		:param str var: (or None) Either 'r' or 'pts'
+		:returns: Array of shape (len(acbins),len(tbins),samples) where the last row and column are zero
+		'''
+
+		v = ['r','pts'].index(var)
+		g = np.zeros((len(self.acbins),len(self.tbins),len(self.snums)))
+		g[:-1,:-1] = np.moveaxis(self.arr[:,:,:,perc,v],0,-1)
+		return(g)
+
+	def to_dataframe(self):
+		'''
+		Export landmarks in the format created by :py:func:`landmarks.calc_perc` with a row for each sample and a column for each landmark, e.g. '-12.3_-10.1_-3.14_-2.36_50_r'
+
+		:returns: pd.DataFrame with the column 'stype' followed by a pts and r column for each landmark
+		'''
+
+		ns,na,nt,npc = self.arr.shape[:4]
+
+		names = []
+		for a in range(na):
+			for t in range(nt):
+				name = lmk_name(self.acbins,self.tbins,a,t)
+				for p in self.percbins:
+					names += [name+'_'+str(p)+'_pts',name+'_'+str(p)+'_r']
+
+		#Create integer pts and float r columns at once and interleave them by name
+		index = [int(s) for s in self.snums]
+		df = pd.concat([
+			pd.DataFrame({'stype':self.stypes},index=index),
+			pd.DataFrame(self.arr[...,1].reshape(ns,-1).astype(int),columns=names[0::2],index=index),
+			pd.DataFrame(self.arr[...,0].reshape(ns,-1),columns=names[1::2],index=index)
+			],axis=1)
+
+		return(df[['stype']+names])
+
+class landmark_sketch:
+	'''
+	Mergeable quantile sketch of r for each landmark bin that can be fed chunk by chunk instead of keeping every point of a sample in memory
+
+	Values of r are counted in logarithmic buckets so that each percentile is estimated within a relative error of `accuracy`. Sketches with the same bins can be merged to calculate landmarks for a group of samples.
+
+	:param array acbins: Array containing the boundaries of each bin along alpha
+	:param array tbins: Array containing the boundaries of each bin along theta
+	:param float accuracy: (or None) Relative accuracy of the estimated r values, 0.01 by default
+
+	.. py:attribute:: landmark_sketch.keys
+
+		Sorted array of integers that identify a landmark bin and a bucket of r
+
+	.. py:attribute:: landmark_sketch.counts
+
+		Array containing the number of points in each bucket of :py:attr:`landmark_sketch.keys`
+
+	.. py:attribute:: landmark_sketch.n
+
+		Number of points that have been added to the sketch within the bins
+	'''
+
+	#Number of buckets reserved on each side of r=1 and the smallest r that is not counted as zero
+	offset = 2**20
+	rmin = 1e-9
+
+	def __init__(self,acbins,tbins,accuracy=0.01):
+
+		self.acbins = np.asarray(acbins)
+		self.tbins = np.asarray(tbins)
+		self.accuracy = accuracy
+		self.gamma = (1+accuracy)/(1-accuracy)
+
+		self.nseg = (len(self.acbins)-1)*(len(self.tbins)-1)
+		self.keys = np.zeros(0,dtype=np.int64)
+		self.counts = np.zeros(0,dtype=np.int64)
+		self.n = 0
+
+	def bucket(self,r):
+		'''
+		Calculate the logarithmic bucket of each value of r, values below :py:attr:`landmark_sketch.rmin` share the lowest bucket
+
+		:param np.array r: Array of r values
+		:returns: Array of integer buckets
+		'''
+
+		r = np.asarray(r,dtype=float)
+		b = np.full(len(r),-self.offset,dtype=np.int64)
+		pos = r > self.rmin
+		b[pos] = np.clip(np.ceil(np.log(r[pos])/np.log(self.gamma)),-self.offset+1,self.offset-1)
+		return(b)
+
+	def value(self,b):
+		'''
+		Estimate r for each bucket
+
+		:param np.array b: Array of integer buckets
+		:returns: Array of r values that are within :py:attr:`landmark_sketch.accuracy` of every value in the bucket
+		'''
+
+		v = 2*np.power(self.gamma,b.astype(float))/(self.gamma+1)
+		v[b == -self.offset] = 0
+		return(v)
+
+	def add_counts(self,keys,counts):
+		'''
+		Combine keys and counts with the contents of the sketch
+
+		:param np.array keys: Array of integer keys
+		:param np.array counts: Array containing the number of points for each key
+		'''
+
+		keys,inv = np.unique(np.concatenate([self.keys,keys]),return_inverse=True)
+		self.counts = np.bincount(inv,weights=np.concatenate([self.counts,counts]),
+			minlength=len(keys)).astype(np.int64)
+		self.keys = keys
+		self.n = int(self.counts.sum())
+
+	def add(self,ac,theta,r):
+		'''
+		Add a chunk of points to the sketch, points outside of the bins are ignored
+
+		:param np.array ac: Array of alpha values
+		:param np.array theta: Array of theta values
+		:param np.array r: Array of r values
+		'''
+
+		seg = bin_points(np.asarray(ac),np.asarray(theta),self.acbins,self.tbins)
+		keep = seg >= 0
+
+		keys = seg[keep].astype(np.int64)*2*self.offset + self.bucket(np.asarray(r)[keep]) + self.offset
+		keys,counts = np.unique(keys,return_counts=True)
+		self.add_counts(keys,counts)
+
+	def add_df(self,df):
+		'''
+		Add a chunk of points from a dataframe, e.g. :py:attr:`brain.df_align` or a chunk from :py:func:`read_psi_chunks`
+
+		:param pd.DataFrame df: Dataframe containing columns ac,r,theta
+		'''
+
+		self.add(df.ac.values,df.theta.values,df.r.values)
+
+	def merge(self,other):
+		'''
+		Add the counts of another sketch with the same bins and accuracy to this sketch
+
+		:param landmark_sketch other: Sketch that will be merged into this sketch
+		:returns: This sketch
+		'''
+
+		if (self.accuracy != other.accuracy or not np.array_equal(self.acbins,other.acbins)
+				or not np.array_equal(self.tbins,other.tbins)):
+			raise ValueError('Sketches can only be merged if they have the same bins and accuracy')
+
+		self.add_counts(other.keys,other.counts)
+		return(self)
+
+	def copy(self):
+		'''
+		:returns: Copy of the sketch
+		'''
+
+		sk = landmark_sketch(self.acbins,self.tbins,self.accuracy)
+		sk.keys,sk.counts,sk.n = self.keys.copy(),self.counts.copy(),self.n
+		return(sk)
+
+	def calc_array(self,percbins,rnull):
+		'''
+		Estimate landmarks in the layout of :py:func:`landmarks.calc_perc_array`
+
+		:param list percbins: List of integers between 0 and 100
+		:param int rnull: Value assigned to r in bins without points
+		:returns: Array of shape (alpha bins,theta bins,percentiles,2) containing r and the number of points in buckets below r
+		'''
+
+		seg = self.keys//(2*self.offset)
+		b = self.keys%(2*self.offset) - self.offset
+
+		cum = np.cumsum(self.counts)
+		nseg = np.bincount(seg,weights=self.counts,minlength=self.nseg)
+		start = np.cumsum(nseg)-nseg
+
+		out = np.zeros((self.nseg,len(percbins),2))
+		full = nseg > 0
+		for i,p in enumerate(percbins):
+			#Find the buckets of the two points around the rank used by np.percentile and interpolate between them
+			rank = p/100*(nseg[full]-1)
+			lo = np.floor(rank)
+			hi = np.minimum(lo+1,nseg[full]-1)
+
+			ilo = np.searchsorted(cum,start[full]+lo,side='right')
+			ihi = np.searchsorted(cum,start[full]+hi,side='right')
+			r = self.value(b[ilo]) + (rank-lo)*(self.value(b[ihi])-self.value(b[ilo]))
+
+			#Count the points in buckets below the bucket of r
+			k = np.searchsorted(self.keys,np.flatnonzero(full)*2*self.offset + self.bucket(r) + self.offset)
+			below = np.where(k > 0,cum[np.maximum(k-1,0)],0) - start[full]
+
+			out[full,i,0] = r
+			out[full,i,1] = below
+			out[~full,i,0] = rnull
+
+		return(out.reshape(len(self.acbins)-1,len(self.tbins)-1,len(percbins),2))
+
+def merge_sketches(sketches):
+	'''
+	Merge a list of :py:class:`landmark_sketch` objects into a new sketch, e.g. to calculate landmarks for a group of samples
+
+	:param list sketches: List of sketches with the same bins and accuracy
+	:returns: :py:class:`landmark_sketch`
+	'''
+
+	sketches = list(sketches)
+	out = sketches[0].copy()
+	for sk in sketches[1:]:
+		out.merge(sk)
+	return(out)
+
+class landmark_stats:
+	'''
+	Accumulate the mean and standard error of each landmark of a group one sample at a time using Welford's algorithm, so memory does not depend on the number of samples
+
+	Accumulators of the same bins can be merged, e.g. to combine the results of several processes
+
+	:param array acbins: Array containing the boundaries of each bin along alpha
+	:param array tbins: Array containing the boundaries of each bin along theta
+	:param list percbins: List of integers between 0 and 100 for each percentile
+
+	.. py:attribute:: landmark_stats.n
+
+		Array of shape (alpha bins,theta bins,percentiles) containing the number of samples added to each landmark
+
+	.. py:attribute:: landmark_stats.mean
+
+		Array of shape (alpha bins,theta bins,percentiles,2) containing the mean of r and pts
+
+	.. py:attribute:: landmark_stats.m2
+
+		Array of shape (alpha bins,theta bins,percentiles,2) containing the sum of squared differences from the mean of r and pts
+	'''
+
+	def __init__(self,acbins,tbins,percbins):
+
+		self.acbins = np.asarray(acbins)
+		self.tbins = np.asarray(tbins)
+		self.percbins = list(percbins)
+
+		shape = (len(self.acbins)-1,len(self.tbins)-1,len(self.percbins))
+		self.n = np.zeros(shape)
+		self.mean = np.zeros(shape+(2,))
+		self.m2 = np.zeros(shape+(2,))
+
+	def add(self,arr):
+		'''
+		Add the landmarks of one sample
+
+		:param np.array arr: Array of shape (alpha bins,theta bins,percentiles,2) from :py:func:`landmarks.calc_perc_array`
+		'''
+
+		self.n += 1
+		delta = arr-self.mean
+		self.mean += delta/self.n[...,None]
+		self.m2 += delta*(arr-self.mean)
+
+	def combine(self,n,mean,m2):
+		'''
+		Combine counts, means and sums of squared differences with the accumulator using the parallel algorithm of Chan et al.
+
+		:param np.array n: Array of sample counts
+		:param np.array mean: Array of means
+		:param np.array m2: Array of sums of squared differences from the mean
+		'''
+
+		total = self.n+n
+		with np.errstate(divide='ignore',invalid='ignore'):
+			w = np.where(total > 0,n/total,0)[...,None]
+
+		delta = mean-self.mean
+		self.mean = self.mean + delta*w
+		self.m2 = self.m2 + m2 + delta**2*(self.n*w[...,0])[...,None]
+		self.n = total
+
+	def add_tensor(self,lt):
+		'''
+		Add every sample in a :py:class:`landmark_tensor`
+
+		:param landmark_tensor lt: Landmarks with the same bins as the accumulator
+		'''
+
+		n = np.full(self.n.shape,float(len(lt.snums)))
+		mean = lt.arr.mean(axis=0)
+		self.combine(n,mean,((lt.arr-mean)**2).sum(axis=0))
+
+	def merge(self,other):
+		'''
+		Add the samples of another accumulator with the same bins
+
+		:param landmark_stats other: Accumulator that will be merged into this accumulator
+		:returns: This accumulator
+		'''
+
+		self.combine(other.n,other.mean,other.m2)
+		return(self)
+
+	def sem(self):
+		'''
+		:returns: Array of shape (alpha bins,theta bins,percentiles,2) containing the standard error of the mean of r and pts as calculated by :py:func:`stats.sem`
+		'''
+
+		n = self.n[...,None]
+		with np.errstate(divide='ignore',invalid='ignore'):
+			return(np.where(n > 1,np.sqrt(self.m2/(n-1)/n),np.nan))
+
+	def to_dataframe(self):
+		'''
+		Create the table of :py:func:`reformat_to_cart` from the accumulated landmarks
+
+		:returns: pd.DataFrame with each landmark as a row and columns: x,y,z,r,r_sem,t,pts
+		'''
+
+		na,nt,npc = self.n.shape
+		x = np.repeat(lmk_centers(self.acbins),nt*npc)
+		t = np.tile(np.repeat(lmk_centers(self.tbins),npc),na)
+		r = self.mean[...,0].ravel()
+
+		return(pd.DataFrame({
+			'x':x,
+			'y':np.sin(t)*r,
+			'z':np.cos(t)*r,
+			'r':r,
+			'r_sem':self.sem()[...,0].ravel(),
+			't':t,
+			'pts':self.mean[...,1].ravel()
+			},columns=['x','y','z','r','r_sem','t','pts']))
+
+def reformat_to_cart(df):
+	'''
+	Take a dataframe in which columns contain the bin parameters and convert to a cartesian coordinate system
+
+	:param df: Dataframe containing columns with string names that contain the bin parameter, a :py:class:`landmark_tensor` or a :py:class:`landmark_stats`
+	:type: pd.DataFrame, :py:class:`landmark_tensor` or :py:class:`landmark_stats`
+	:returns: pd.DataFrame with each landmark as a row and columns: x,y,z,r,r_std,t,pts
+	'''
+
+	#Read landmarks directly from the array
+	if isinstance(df,landmark_tensor):
+		ls = landmark_stats(df.acbins,df.tbins,df.percbins)
+		ls.add_tensor(df)
+		return(ls.to_dataframe())
+
+	if isinstance(df,landmark_stats):
+		return(df.to_dataframe())
+
+	L = []
+	for c in df.columns:
+		if len(c.split('_')) == 6:
+			amn,amx,tmn,tmx,p,dtype = c.split('_')
+			x = np.mean([float(amn),float(amx)])
+			t = np.mean([float(tmn),float(tmx)])
+
+			if dtype == 'r':
+				r = np.mean(df[c])
+				r_std = stats.sem(df[c])
+				y = np.sin(t)*r
+				z = np.cos(t)*r
+
+				pts = np.mean(df['_'.join([amn,amx,tmn,tmx,p,'pts'])])
+
+				L.append({'x':x,'y':y,'z':z,'r':r,'r_sem':r_std,'t':t,'pts':pts})
+
+	#Create dataframe once from the list of landmarks
+	ndf = pd.DataFrame(L,columns=['x','y','z','r','r_sem','t','pts'])
+	return(ndf)
+
+def convert_to_arr(xarr,tarr,mdf,Ldf=[]):
+	'''
+	Convert a pandas dataframe containing landmarks as columns and samples as rows into a 3D numpy array
+
+	The columns of `mdf` determine which landmarks will be saved into the array. Any additional dataframes that need to be converted can be included in Ldf
+
+	:param np.array xarr: Array containing all unique x values of landmarks in the dataset
+	:param np.array tarr: Array containing all unique t values of landmarks in the dataset
+	:param mdf: Main landmark dataframe containing landmarks as columns and samples as rows or a :py:class:`landmark_tensor`, in which case the array is read directly with :py:func:`landmark_tensor.grid`
+	:type: pd.DataFrame or :py:class:`landmark_tensor`
+	:param list Ldf: List of additional pd.DataFrames or :py:class:`landmark_tensor` objects that should also be converted to arrays
+	:returns: Array of the main dataframe and list of arrays converted from Ldf
+	'''
+
+	if isinstance(mdf,landmark_tensor):
+		return(mdf.grid(),[df.grid() for df in Ldf])
+
+	marr = np.zeros((len(xarr),len(tarr),len(mdf.index)))
+	xarr = np.round(xarr,2)
+	tarr = np.round(tarr,2)
+	Larr = []
+	for df in Ldf:
+		Larr.append(np.zeros((len(xarr),len(tarr),len(df.index))))
+
+	for c in mdf.columns:
+		if len(c.split('_')) == 6:
+			amn,amx,tmn,tmx,p,dtype = c.split('_')
+			x = float(amn)#np.mean([float(amn),float(amx)])
+			t = float(tmn) #np.mean([float(tmn),float(tmx)])
+	        
+			if dtype == 'r':
+				marr[np.where(xarr==x)[0],np.where(tarr==t)[0]] = mdf[c]
+				for arr,df in zip(Larr,Ldf):
+					arr[np.where(xarr==x)[0],np.where(tarr==t)[0]] = df[c]
+	                
+	return(marr,Larr)
+
+def calc_variance(anum,dfs):
+	'''
+	Calculate the variance between samples according to bin position and variance between adjacent bins 
+
+	:param int anum: Number of bins which the arclength axis should be divided into
+	:param dict dfs: Dictionary of dfs which are going to be processed
+	:returns: Two arrays: svar (anum,tnum) and bvar (anum*tnum,snum)
+	:rtype: np.array 
+	'''
+
+	#Set up bins
+	lm = landmarks(percbins=[50],rnull=15)
+	lm.calc_bins(dfs.values(),anum,np.pi/4)
+
+	#Calculate landmarks
+	lt = lm.calc_tensor(dfs,'wt')
+	    
+	#Convert to arr for variance calculation
+	lmarr,arr = convert_to_arr(lm.acbins,lm.tbins,lt)
+
+	svar = np.var(lmarr,axis=2)
+
+	Lvar = []
+	for i in range(1,len(lm.acbins)-2):
+		for t in range(0,len(lm.tbins)):
+			#Save the variance of a particular bin and adjacent neighbors across a set of samples
+			Lvar.append(np.var(lmarr[i-1:i+2,t],axis=0))
+	        
+	return(svar,np.array(Lvar))
+
+def sort_sample(df,tbins):
+	'''
+	Sort the points of a sample by r and assign theta bins once so that landmarks can be recalculated for any set of alpha bins with :py:func:`sorted_landmarks`
+
+	:param pd.DataFrame df: Dataframe containing columns alpha,r,theta
+	:param array tbins: Array containing the boundaries of each bin along theta
+	:returns: Tuple of arrays (r,ac,theta bin) in order of increasing r
+	'''
+
+	order = np.argsort(df.r.values,kind='mergesort')
+
+	return((df.r.values[order].astype(float),
+		df.ac.values[order].astype(float),
+		bin_axis(df.theta.values[order],tbins)))
+
+def sorted_landmarks(sample,acbins,ntbins,percbins,rnull):
+	'''
+	Calculate landmarks of a sample prepared with :py:func:`sort_sample` without sorting r again
+
+	Points are grouped by bin with a stable sort of the integer bin keys, which keeps r sorted within each bin
+
+	:param tuple sample: Tuple of arrays (r,ac,theta bin) from :py:func:`sort_sample`
+	:param array acbins: Array containing the boundaries of each bin along alpha
+	:param int ntbins: Number of bins along theta
+	:param list percbins: List of integers between 0 and 100
+	:param int rnull: Value assigned to r when the percentile cannot be calculated
+	:returns: Array of shape (len(acbins)-1,ntbins,len(percbins),2) containing r and pts
+	'''
+
+	r,ac,it = sample
+	ia = bin_axis(ac,acbins)
+	na = len(acbins)-1
+
+	keep = (ia >= 0) & (it >= 0)
+	key = ia[keep]*ntbins + it[keep]
+	if na*ntbins < 2**16:
+		key = key.astype(np.uint16)
+
+	rs = r[keep][np.argsort(key,kind='stable')]
+	counts = np.bincount(key,minlength=na*ntbins)
+	starts = np.cumsum(counts)-counts
+
+	arr = segment_percentiles(rs,starts,counts,percbins,rnull)
+	return(arr.reshape(na,ntbins,len(percbins),2))
+
+#Samples and parameters shared with sweep_grid in each process of a parameter sweep
+sweep_state = {}
+
+def init_sweep(samples,acmin,acmax,tbins,percbins,rnull):
+	'''
+	Store the samples and parameters of a parameter sweep for :py:func:`sweep_grid`, which is also used as the initializer of each process in the pool
+
+	:param list samples: List of samples prepared with :py:func:`sort_sample`
+	:param float acmin: Minimum value of alpha
+	:param float acmax: Maximum value of alpha
+	:param array tbins: Array containing the boundaries of each bin along theta
+	:param list percbins: List of integers between 0 and 100
+	:param int rnull: Value assigned to r when the percentile cannot be calculated
+	'''
+
+	sweep_state.update({'samples':samples,'acmin':acmin,'acmax':acmax,
+		'tbins':tbins,'percbins':percbins,'rnull':rnull})
+
+def sweep_grid(anum):
+	'''
+	Calculate the landmark array for a single value of anum from the samples stored by :py:func:`init_sweep`
+
+	:param int anum: Number of bins which the arclength axis should be divided into
+	:returns: Array in the layout of :py:func:`convert_to_arr` and the array of alpha bins
+	'''
+
+	S = sweep_state
+	acbins = calc_acbins(S['acmin'],S['acmax'],anum)
+	nt = len(S['tbins'])-1
+
+	arr = np.array([sorted_landmarks(sample,acbins,nt,S['percbins'],S['rnull']) for sample in S['samples']])
+	lt = landmark_tensor(arr,range(len(arr)),['s']*len(arr),acbins,S['tbins'],S['percbins'])
+
+	return(lt.grid(),acbins)
+
+class anumSelect:
+
+	def __init__(self,dfs):
+		'''
+		A class that assists in selecting the optimum value of anum
+
+		:param dict dfs: Dictionary of pd.DataFrames with samples to use for optimization
+		
+		.. attribute:: anumSelect.dfs
+
+			Dictionary of dataframes that will be used for the parameter sweep
+
+		.. attribute:: anumSelect.Lsv
+
+			List of sample variance arrays for each anum in the sweep
+
+		.. attribute:: anumSelect.Lbv
+
+			List of bin variance arrays for each anum in the sweep
+
+		.. attribute:: anumSelect.Msv
+
+			List of values of the average sample variance for each anum in the sweep
+
+		.. attribute:: anumSelect.Mbv
+
+			List of values of the average bin variance for each anum in the sweep
+
+		.. attribute:: anumSelect.Llm
+
+			List of landmark arrays for each anum in the sweep
+
+		'''
 
 		self.dfs = dfs
 		self.Lsv,self.Lbv = [],[]
 		self.Msv,self.Mbv = [],[]
 		self.Llm = []
+		self.sweep = None
+
+	def prepare_sweep(self,tstep,percbins,rnull):
+		'''
+		Sort each sample by r and assign theta bins once with :py:func:`sort_sample` so that every value of anum reuses the sorted data
+
+		:param float tstep: The size of each bin used for theta
+		:param list percbins: (or None) Must be a list of integers between 0 and 100 
+		:param int rnull: (or None) When the r value cannot be calculated it will be set to this value
+
+		.. attribute:: anumSelect.sweep
+
+			Tuple of the parameters used to prepare the sweep data
+
+		.. attribute:: anumSelect.sweep_args
+
+			Tuple of the sorted samples and parameters of this object that are passed to :py:func:`init_sweep` before landmarks are calculated
+		'''
+
+		if self.sweep == (tstep,tuple(percbins),rnull):
+			return
+
+		tbins = np.arange(-np.pi,np.pi+tstep,tstep)
+		acmin,acmax = ac_range(self.dfs.values())
+		samples = [sort_sample(self.dfs[k],tbins) for k in self.dfs.keys()]
+
+		self.sweep_args = (samples,acmin,acmax,tbins,percbins,rnull)
+		self.sweep = (tstep,tuple(percbins),rnull)
+
+	def sweep_grids(self,anums,n_jobs=None):
+		'''
+		Calculate the landmark array of each value of anum with :py:func:`sweep_grid` from the samples of this object
+
+		:param list anums: List of the number of alpha bins
+		:param int n_jobs: (or None) Number of processes, runs in a single process by default
+		:returns: List of landmark arrays and alpha bins from :py:func:`sweep_grid`
+		'''
+
+		if n_jobs == None or n_jobs == 1:
+			#Other objects share the module state, so it is set for every call and cleared afterwards
+			init_sweep(*self.sweep_args)
+			try:
+				return([sweep_grid(a) for a in anums])
+			finally:
+				sweep_state.clear()
+
+		pool = mp.Pool(n_jobs,initializer=init_sweep,initargs=self.sweep_args)
+		try:
+			return(pool.map(sweep_grid,anums))
+		finally:
+			pool.terminate()
+			pool.join()
+
+	def add_variance(self,anum,lmarr,acbins,tbins):
+		'''
+		Calculate the sample and bin variance of a landmark array and add them to the results of the sweep
+
+		:param int anum: Number of bins which the arclength axis was divided into
+		:param np.array lmarr: Landmark array in the layout of :py:func:`convert_to_arr`
+		:param array acbins: Array containing the boundaries of each bin along alpha
+		:param array tbins: Array containing the boundaries of each bin along theta
+		'''
+
+		self.Llm.append(lmarr)
+
+		#Calculate variance between samples
+		svar = np.var(lmarr,axis=2)
+
+		#Calculate variance between bins
+		Lvar = []
+		for i in range(1,len(acbins-2)):
+			for t in range(0,len(tbins)):
+				Lvar.append(np.var(lmarr[i-1:i+2,t],axis=0))
+
+		self.Lsv.append(svar)
+		self.Msv.append(np.mean(svar))
+		self.Lbv.append(np.array(Lvar))
+		self.Mbv.append(np.mean(np.array(Lvar)))
+
+		print(anum,'calculation complete')
+
+	def calc_variance(self,anum,tstep,percbins,rnull):
+		'''
+		Calculate the variance between samples according to bin position and variance between adjacent bins 
+
+		:param int anum: Number of bins which the arclength axis should be divided into
+		:param float tstep: The size of each bin used for alpha
+		:param dict dfs: Dictionary of dfs which are going to be processed
+		:param list percbins: (or None) Must be a list of integers between 0 and 100 
+		:param int rnull: (or None) When the r value cannot be calculated it will be set to this value
+		'''
+
+		self.prepare_sweep(tstep,percbins,rnull)
+
+		lmarr,acbins = self.sweep_grids([anum])[0]
+		self.add_variance(anum,lmarr,acbins,self.sweep_args[3])
+
+	def param_sweep(self,tstep,amn=2,amx=50,step=1,percbins=[50],rnull=15,n_jobs=None):
+		'''
+		Calculate landmarks for each value of anum specified in input range
+
+		Samples are sorted once with :py:func:`anumSelect.prepare_sweep` and reused for every value of anum
+
+		:param float tstep: The size of each bin used for theta
+		:param int amn: The minimum number of alpha bins that should be considered
+		:param int amx: The maximum number of alpha bins that should be considered
+		:param int step: The step size in the range of amn to amx
+		:param list percbins: (or None) Must be a list of integers between 0 and 100 
+		:param int rnull: (or None) When the r value cannot be calculated it will be set to this value
+		:param int n_jobs: (or None) Number of processes used to calculate anum values in parallel. Runs in a single process by default
+		'''
+
+		self.prepare_sweep(tstep,percbins,rnull)
+		anums = np.arange(amn,amx,step)
+
+		results = self.sweep_grids(anums,n_jobs)
+
+		for a,(lmarr,acbins) in zip(anums,results):
+			self.add_variance(a,lmarr,acbins,self.sweep_args[3])
+
+		print('Parameter sweep complete')
+
+	def plot_rawdata(self):
+		'''
+		Plot raw data from parameter sweep
+		'''
+		x = np.arange(2,len(self.Lsv))
+		fig,ax = plt.subplots()
+
+		ax.plot(x,self.Mbv[2:],c='b',ls='--',label='Raw Bin Variance')
+		ax.plot(x,self.Msv[2:],c='g',ls='--',label='Raw Sample Variance')
+
+		ax.legend()
+		ax.set_xlabel('Number of Alpha Bins')
+		ax.set_ylabel('Relative Variance')
+
+	def plot_fitted(self,dof):
+		'''
+		Plot polynomial fits over the raw data
+
+		:param int dof: Degree of the polynomial function to be fit
+		'''
+
+		x = np.arange(2,len(self.Lsv))
+		fig,ax = plt.subplots()
+
+		ax.plot(x,self.Mbv[2:],c='b',ls='--',label='Raw Bin Variance')
+		ax.plot(x,self.Msv[2:],c='g',ls='--',label='Raw Sample Variance')
+
+		pbv = np.polyfit(x,self.Mbv[2:],dof)
+		fbv = np.poly1d(pbv)
+		ax.plot(x,fbv(x),c='b',label='Fit Bin Variance')
+
+		psv = np.polyfit(x,self.Msv[2:],dof)
+		fsv = np.poly1d(psv)
+		ax.plot(x,fsv(x),c='g',label='Fit Sample Variance')
+
+		ax.legend()
+		ax.set_xlabel('Number of Alpha Bins')
+		ax.set_ylabel('Relative Variance')
+
+	def find_optimum_anum(self,dof,guess):
+		'''
+		Calculate optimum anum and plot
+
+		:param int dof: Degree of the polynomial function to be fit
+		:param int guess: Best guess of the optimum anum, which cannot be less than the maximum bin variance
+		'''
+
+		x = np.arange(2,len(self.Lsv))
+		fig,ax = plt.subplots()
+
+		pbv = np.polyfit(x,normalize(self.Mbv[2:])[0],dof)
+		fbv = np.poly1d(pbv)
+		ax.plot(x,fbv(x),c='b',label='Bin Variance')
+
+		psv = np.polyfit(x,normalize(self.Msv[2:])[0],dof)
+		fsv = np.poly1d(psv)
+		ax.plot(x,fsv(x),c='g',label='Sample Variance')
+
+		opt = minimize(fbv+fsv,guess)
+		ax.axvline(opt.x,c='r',label='Optimum: '+str(np.round(opt.x[0],2)))
+
+		ax.legend()
+		ax.set_xlabel('Number of Alpha Bins')
+		ax.set_ylabel('Relative Variance')
+
+P = {
+	'zln':2,'zpt':3,'zfb':1,
+	'wtc':'b','mtc':'r',
+	'alpha':0.3,
+	'cmap':'Greys_r',
+	'xarr':None,
+	'tarr':None
+}
+
+def subplot_lmk(ax,p,avg,sem,parr,xarr,tarr,dtype,Pn=P):
+	'''
+	Plot a ribbon of average and standard error of the mean onto the subplot, `ax`
+
+	:param plt.Subplot ax: Matplotlib subplot onto which the data should be plotted
+	:param list p: List of two theta values that should be plotted
+	:param np.array avg: Array of shape (xvalues,tvalues) containing the average values of the data
+	:param np.array sem: Array of shape (xvalues,tvalues) containing the standard error of the mean values of the data
+	:param np.array parr: Array of shape (xvalues,tvalues) containing the p values for the data
+	:param str dtype: String describing sample type
+	:param Pn: Dictionary containing the following values: 'zln':2,'zpt':3,'zfb':1,'wtc':'b','mtc':'r','alpha':0.3,'cmap':'Greys_r'
+	:type: dict or None
+	'''
+
+	for k in Pn.keys():
+		P[k] = Pn[k]
+
+	if dtype=='wt':
+		c = P['wtc']
+	else:
+		c = P['mtc']
+
+	ti1 = np.where(tarr==p[0])[0][0]
+	ti2 = np.where(tarr==p[1])[0][0]
+
+	ax.fill_between(xarr,avg[:,ti1]+sem[:,ti1],avg[:,ti1]-sem[:,ti1],alpha=P['alpha'],color=c,zorder=P['zfb'])
+	ax.fill_between(xarr,-avg[:,ti2]+sem[:,ti2],-avg[:,ti2]-sem[:,ti2],alpha=P['alpha'],color=c,zorder=P['zfb'])
+
+	ax.plot(xarr,avg[:,ti1],c=c,zorder=P['zln'])
+	ax.plot(xarr,-avg[:,ti2],c=c,zorder=P['zln'])
+
+	if dtype=='mt':
+		ax.scatter(xarr,avg[:,ti1],c=parr[:,ti1],cmap=P['cmap'],zorder=P['zpt'])
+		ax.scatter(xarr,-avg[:,ti2],c=parr[:,ti2],cmap=P['cmap'],zorder=P['zpt'])
+
+##### Landmark statistics ############
+
+#Landmarks of both groups shared with resample_chunk in each process of landmark_test
+test_state = {}
+
+def init_test(X,Y,method):
+	'''
+	Store the landmarks of both groups for :py:func:`resample_chunk`, which is also used as the initializer of each process in the pool
+
+	:param np.array X: Array of shape (wildtype samples,landmarks)
+	:param np.array Y: Array of shape (mutant samples,landmarks)
+	:param str method: Either 'permutation' or 'bootstrap'
+	'''
+
+	Z = np.concatenate([X,Y])
+	obs = np.abs(Y.mean(axis=0)-X.mean(axis=0))
+
+	if method == 'bootstrap':
+		#Shift both groups to the pooled mean so that resamples follow the null hypothesis
+		X = X - X.mean(axis=0) + Z.mean(axis=0)
+		Y = Y - Y.mean(axis=0) + Z.mean(axis=0)
+
+	test_state.update({'X':X,'Y':Y,'Z':Z,'method':method,'obs':obs})
+
+def resample_chunk(task):
+	'''
+	Calculate a chunk of resampled differences between the group means for every landmark at once and count how often they are at least as large as the observed difference
+
+	:param tuple task: Number of resamples in the chunk and the np.random.SeedSequence used to generate them
+	:returns: Array containing the number of resamples for each landmark with an absolute difference at least as large as the observed difference
+	'''
+
+	size,seed = task
+	S = test_state
+	rng = np.random.default_rng(seed)
+	nx,ny = len(S['X']),len(S['Y'])
+
+	if S['method'] == 'permutation':
+		#Each row selects nx samples of the pooled data as the wildtype group
+		W = np.argsort(rng.random((size,nx+ny)),axis=1) < nx
+		sx = W.astype(float) @ S['Z']
+		diff = (S['Z'].sum(axis=0)-sx)/ny - sx/nx
+	else:
+		#Each row counts how often each sample is drawn with replacement
+		Wx = rng.multinomial(nx,np.ones(nx)/nx,size=size)
+		Wy = rng.multinomial(ny,np.ones(ny)/ny,size=size)
+		diff = (Wy @ S['Y'])/ny - (Wx @ S['X'])/nx
+
+	return((np.abs(diff) >= S['obs'] - 1e-12).sum(axis=0))
+
+def fdr_correction(p):
+	'''
+	Adjust p values for multiple comparisons with the Benjamini-Hochberg procedure
+
+	:param np.array p: Array of p values of any shape, nan values are ignored
+	:returns: Array of adjusted p values with the same shape as `p`
+	'''
+
+	p = np.asarray(p,dtype=float)
+	q = np.full(p.shape,np.nan)
+
+	valid = ~np.isnan(p)
+	pv = p[valid]
+	order = np.argsort(pv)
+	ranked = pv[order]*len(pv)/np.arange(1,len(pv)+1)
+
+	#Enforce monotonicity from the largest p value down
+	ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+	qv = np.empty(len(pv))
+	qv[order] = np.minimum(ranked,1)
+	q[valid] = qv
+
+	return(q)
+
+def landmark_test(wt,mt,method='permutation',n_resamples=1000,perc=-1,fdr=False,max_bytes=2**27,n_jobs=None,seed=None):
+	'''
+	Test the difference between wildtype and mutant landmarks with a permutation or bootstrap test of the difference in means, which is calculated for every landmark at once
+
+	Resamples are processed in chunks whose size is chosen so that the resampled means fit in `max_bytes`, and chunks can be spread over a pool of processes. Results are reproducible for a given `seed` regardless of `n_jobs`.
+
+	:param landmark_tensor wt: Landmarks of the wildtype samples
+	:param landmark_tensor mt: Landmarks of the mutant samples with the same bins as `wt`
+	:param str method: (or None) Either 'permutation' (default) or 'bootstrap'
+	:param int n_resamples: (or None) Number of resamples, 1000 by default
+	:param int perc: (or None) Index of the percentile in :py:attr:`landmark_tensor.percbins` that is tested, the last percentile by default
+	:param bool fdr: (or None) Set to True to adjust p values with :py:func:`fdr_correction`
+	:param int max_bytes: (or None) Approximate memory used by each chunk of resamples
+	:param int n_jobs: (or None) Number of processes used to calculate chunks in parallel. Runs in a single process by default
+	:param int seed: (or None) Seed for the random number generator
+	:returns: Arrays of p values and effect sizes (Cohen's d of mutant minus wildtype) of shape (alpha bins,theta bins), which is the shape of `parr` in :py:func:`subplot_lmk` when indexed with :py:attr:`landmark_tensor.x` and :py:attr:`landmark_tensor.t`
+	'''
+
+	if not (np.array_equal(wt.acbins,mt.acbins) and np.array_equal(wt.tbins,mt.tbins) and wt.percbins == mt.percbins):
+		raise ValueError('Wildtype and mutant landmarks must have the same acbins, tbins and percbins')
+
+	shape = wt.arr.shape[1:3]
+	X = wt.r()[...,perc].reshape(len(wt.snums),-1)
+	Y = mt.r()[...,perc].reshape(len(mt.snums),-1)
+
+	#Effect size of the observed difference
+	nx,ny = len(X),len(Y)
+	sd = np.sqrt(((nx-1)*X.var(axis=0,ddof=1)+(ny-1)*Y.var(axis=0,ddof=1))/(nx+ny-2))
+	with np.errstate(divide='ignore',invalid='ignore'):
+		d = (Y.mean(axis=0)-X.mean(axis=0))/sd
+
+	#Split resamples into chunks that fit in the memory budget
+	size = int(max(1,max_bytes//(8*(X.shape[1]+nx+ny))))
+	sizes = [size]*(n_resamples//size)
+	if n_resamples%size > 0:
+		sizes.append(n_resamples%size)
+	tasks = list(zip(sizes,np.random.SeedSequence(seed).spawn(len(sizes))))
+
+	if n_jobs == None or n_jobs == 1:
+		init_test(X,Y,method)
+		counts = [resample_chunk(t) for t in tasks]
+	else:
+		pool = mp.Pool(n_jobs,initializer=init_test,initargs=(X,Y,method))
+		try:
+			counts = pool.map(resample_chunk,tasks)
+		finally:
+			pool.terminate()
+			pool.join()
+
+	p = (1+np.sum(counts,axis=0))/(1+n_resamples)
+	if fdr == True:
+		p = fdr_correction(p)
+
+	return(p.reshape(shape),d.reshape(shape))
+
+##### PSI file processing ############
+
+def write_header(f):
+	'''
+	Writes header for PSI file with columns Id,x,y,z,ac,r,theta
+
+	:param file f: file object created by 'open(filename,'w')`
+	'''
+
+	contents = [
+		'PSI Format 1.0',
+		'',
+		'column[0] = "Id"',
+		'column[1] = "x"',
+		'column[2] = "y"',
+		'column[3] = "z"',
+		'column[4] = "ac"',
+		'symbol[4] = "A"',
+		'type[4] = float',
+		'column[5] = "r"',
+		'symbol[5] = "R"',
+		'type[5] = float',
+		'column[6] = "theta"',
+		'symbol[6] = "T"',
+		'type[6] = float'
+	]
+
+	for line in contents:
+		f.write('# '+ line + '\n')
+
+#Compression used for psi files with each file extension
+PSI_CODECS = {'.gz':gzip,'.bz2':bz2,'.xz':lzma}
+
+def psi_stem(filepath):
+	'''
+	Files that differ only in compression keep separate summaries and binary copies, since the byte offsets in a summary describe a single file
+
+	:param str filepath: Complete filepath to a psi file, which may be compressed
+	:returns: Filepath without the psi extension followed by the compression extension, e.g. AT_01_AT for AT_01_AT.psi and AT_01_AT_gz for AT_01_AT.psi.gz
+	'''
+
+	base,ext = os.path.splitext(filepath)
+	if ext in PSI_CODECS:
+		base = os.path.splitext(base)[0]+'_'+ext[1:]
+
+	return(base)
+
+def is_psi(filepath):
+	'''
+	:param str filepath: Filename or filepath
+	:returns: True if the file ends in .psi or .psi followed by a compression extension in :py:data:`PSI_CODECS`
+	'''
+
+	base,ext = os.path.splitext(filepath)
+	if ext in PSI_CODECS:
+		base,ext = os.path.splitext(base)
+
+	return(ext == '.psi')
+
+def open_psi(filepath,mode='r',compresslevel=None):
+	'''
+	Open a psi file as text, which is compressed or decompressed as a stream if the file extension is in :py:data:`PSI_CODECS`
+
+	:param str filepath: Complete filepath to file, e.g. AT_01_AT.psi.gz
+	:param str mode: (or None) Either 'r' (default) or 'w'
+	:param int compresslevel: (or None) Compression level of gzip and bz2 (1-9) or preset of lzma (0-9), the default of each codec by default
+	:returns: File object
+	'''
+
+	codec = PSI_CODECS.get(os.path.splitext(filepath)[1])
+
+	if codec == None:
+		return(open(filepath,mode))
+	elif compresslevel == None or mode == 'r':
+		return(codec.open(filepath,mode+'t'))
+	elif codec == lzma:
+		return(lzma.open(filepath,mode+'t',preset=compresslevel))
+	else:
+		return(codec.open(filepath,mode+'t',compresslevel=compresslevel))
+
+class psi_writer:
+	'''
+	Write a psi file one chunk of points at a time, so that the points of a sample never need to be combined in a single dataframe
+
+	The number of points precedes the data in a psi file. If it is not given, a fixed width field is reserved after the header and filled in by :py:func:`psi_writer.close`. Compressed files are written to a temporary file first and compressed on close, since they cannot be rewritten in place.
+
+	:param str filepath: Complete filepath to output file
+	:param int n: (or None) Number of points that will be written, which is written directly instead of reserving a field
+	:param array mm: (or None) Coefficients of the math model that are saved in the summary
+	:param int precision: (or None) Number of decimals written for each value with :py:func:`format_psi_rows`, full precision by default
+	:param int compresslevel: (or None) Compression level used if `filepath` ends in a compression extension (:py:func:`open_psi`)
+	:param bool sort_ac: (or None) Set to True to save the ac range, byte offset and number of points of each chunk in the summary. Chunks must be written in order of ac
+
+	.. py:attribute:: psi_writer.n
+
+		Number of points written so far
+
+	.. py:attribute:: psi_writer.summary
+
+		Summary of the points written so far in the format of :py:func:`psi_summary`
+	'''
+
+	#Number of characters reserved for the number of points
+	width = 20
+
+	def __init__(self,filepath,n=None,mm=None,precision=None,compresslevel=None,sort_ac=False):
+
+		self.filepath = filepath
+		self.total = n
+		self.precision = precision
+		self.compresslevel = compresslevel
+		self.sort_ac = sort_ac
+		self.columns = None
+		self.n = 0
+		self.summary = psi_summary(pd.DataFrame({'x':[]}),mm)
+		self.blocks = []
+
+		#Byte offsets can only be used to seek in uncompressed files
+		self.seekable = os.path.splitext(filepath)[1] not in PSI_CODECS
+
+		if self.seekable or n != None:
+			#Open new file at given filepath, which compresses each chunk as it is written
+			self.f = open_psi(filepath,'w',compresslevel)
+			self.write_start(self.f)
+		else:
+			self.f = tempfile.TemporaryFile('w+',dir=os.path.dirname(os.path.abspath(filepath)))
+
+	def __enter__(self):
+		return(self)
+
+	def __exit__(self,exc_type,*args):
+		if exc_type == None:
+			self.close()
+		else:
+			self.f.close()
+
+	def write_start(self,f):
+		'''
+		Write the header, the number of points and the translation matrix
+
+		:param file f: File object positioned at the start of the psi file
+		'''
+
+		#Write header contents to file
+		write_header(f)
+
+		#Write line with sample number, or reserve space for it
+		if self.total == None:
+			self.count_pos = f.tell()
+			f.write(' '*self.width+' 0 0\n')
+		else:
+			f.write(str(self.total)+' 0 0\n')
+
+		#Write translation matrix
+		f.write('1 0 0\n'+
+				'0 1 0\n'+
+				'0 0 1\n')
+
+	def write_chunk(self,df):
+		'''
+		Append points to the file. The index of `df` is written as the point id
+
+		:param pd.DataFrame df: dataframe containing columns x,y,z and optionally ac,r,theta. Every chunk must have the columns of the first chunk
+		'''
+
+		if self.columns == None:
+			if set(['ac','theta','r']).issubset(df.columns):
+				self.columns = ['x','y','z','ac','theta','r']
+			else:
+				self.columns = ['x','y','z']
+		elif not set(self.columns).issubset(df.columns):
+			raise ValueError('Chunk is missing columns '+str([c for c in self.columns if c not in df.columns]))
+
+		if len(df.index) == 0:
+			return
+
+		chunk = df[self.columns]
+
+		if self.sort_ac == True:
+			if not chunk.ac.is_monotonic_increasing or (len(self.blocks) > 0 and chunk.ac.iloc[0] < self.blocks[-1][1]):
+				raise ValueError('Chunks must be sorted by ac when sort_ac is True')
+			self.blocks.append([float(chunk.ac.iloc[0]),float(chunk.ac.iloc[-1]),
+				self.f.tell() if self.seekable else None,len(chunk.index)])
+
+		if self.precision == None:
+			chunk.to_csv(self.f,sep=' ',index=True,header=False)
+		else:
+			rows = format_psi_rows(chunk.index.values,chunk.values,self.precision)
+			if rows == None:
+				chunk.to_csv(self.f,sep=' ',index=True,header=False,float_format='%.'+str(self.precision)+'f')
+			else:
+				self.f.write(rows.decode())
+
+		#Update the summary with the range of this chunk
+		D = psi_summary(df)
+		self.n += len(chunk.index)
+		self.summary['n'] = self.n
+		for c in ['ac','r','theta']:
+			if c in D:
+				lo,hi = self.summary.get(c,D[c])
+				self.summary[c] = [min(lo,D[c][0]),max(hi,D[c][1])]
+
+	def close(self):
+		'''
+		Fill in the number of points, close the file and save the summary with :py:func:`write_summary`
+		'''
+
+		if self.total != None and self.total != self.n:
+			self.f.close()
+			raise ValueError(str(self.n)+' points written to '+self.filepath+' but '+str(self.total)+' were declared')
+
+		if self.total == None and self.seekable:
+			self.f.seek(self.count_pos)
+			self.f.write(str(self.n).ljust(self.width))
+			self.f.close()
+		elif self.total == None:
+			#Compress the header followed by the points from the temporary file
+			self.total = self.n
+			with open_psi(self.filepath,'w',self.compresslevel) as out:
+				self.write_start(out)
+				self.f.seek(0)
+				shutil.copyfileobj(self.f,out)
+			self.f.close()
+		else:
+			self.f.close()
+
+		if self.sort_ac == True:
+			self.summary['sort'] = 'ac'
+			self.summary['blocks'] = self.blocks
+		write_summary(self.filepath,self.summary)
+
+def write_data(filepath,df,mm=None,binary=False,precision=None,chunksize=100000,compresslevel=None,sort_ac=False):
+	'''
+	Writes data in PSI format to file with a :py:class:`psi_writer`, which writes the header using :py:func:`write_header` and closes the file at the conclusion of writing data.
+
+	A summary of the points is saved next to the psi file with :py:func:`write_summary`
+
+	:param str filepath: Complete filepath to output file
+	:param pd.DataFrame df: dataframe containing columns x,y,z,ac,r,theta
+	:param array mm: (or None) Coefficients of the math model that are saved in the summary
+	:param bool binary: (or None) Set to True to also write a binary copy of the data with :py:func:`write_binary`, which :py:func:`read_psi` reads instead of the text
+	:param int precision: (or None) Number of decimals written for each value with :py:func:`format_psi_rows`. By default values are written at full precision as by :py:func:`pd.DataFrame.to_csv`
+	:param int chunksize: (or None) Number of rows formatted and written at a time
+	:param int compresslevel: (or None) Compression level used if `filepath` ends in a compression extension, e.g. .psi.gz (:py:func:`open_psi`)
+	:param bool sort_ac: (or None) Set to True to write points sorted by ac in blocks of `chunksize` points. The range of ac and the byte offset of each block are saved in the summary so that :py:func:`read_psi` can read only the blocks in an ac range
+	'''
+
+	if sort_ac == True:
+		df = df.sort_values('ac',kind='mergesort')
+
+	#Write the data in chunks so that the text of the whole dataframe is never in memory
+	with psi_writer(filepath,len(df.index),mm,precision,compresslevel,sort_ac) as w:
+		for i in range(0,len(df.index),chunksize):
+			w.write_chunk(df.iloc[i:i+chunksize])
+
+	if binary == True:
+		write_binary(filepath,df)
+
+	print('Write to',filepath,'complete')
+
+def format_int_bytes(v):
+	'''
+	Format integers as ascii digits in a byte array with one row for each value, which is padded with zero bytes on the left
+
+	:param np.array v: Array of integers
+	:returns: Array of uint8 with shape (len(v),digits+1) where the first column holds the sign
+	'''
+
+	v = np.asarray(v,dtype=np.int64)
+	a = np.abs(v)
+	w = len(str(int(a.max()))) if len(a) > 0 else 1
+
+	#Count the digits of each value so that leading zeros can be left out
+	ndig = np.ones(len(a),dtype=np.int64)
+	for j in range(1,w):
+		ndig += a >= 10**j
+
+	D = np.zeros((len(a),w+1),dtype=np.uint8)
+	for j in range(w):
+		D[:,w-j] = np.where(j < ndig,a%10+48,0)
+		a = a//10
+	D[:,0] = np.where(v < 0,ord('-'),0)
+
+	return(D)
+
+def format_fixed_bytes(x,precision):
+	'''
+	Format floats with a fixed number of decimals, which gives the same text as '%.<precision>f'
+
+	:param np.array x: Array of finite floats
+	:param int precision: Number of decimals
+	:returns: Array of uint8 with one row for each value padded with zero bytes, or None if a value is not finite or too large to format exactly
+	'''
+
+	x = np.asarray(x,dtype=float)
+	sc = 10**precision
+	y = np.abs(x)*sc
+
+	if not np.all(np.isfinite(y)) or (len(y) > 0 and y.max() >= 2**52):
+		return(None)
+
+	v = np.round(y).astype(np.int64)
+
+	#Values close to halfway between two decimals are rounded exactly by python
+	tie = np.abs(y-np.floor(y)-0.5) < 1e-6
+	if np.any(tie):
+		v[tie] = [int(('%.*f' % (precision,a)).replace('.','')) for a in np.abs(x[tie])]
+
+	I = format_int_bytes(v//sc)
+	I[:,0] = np.where(np.signbit(x),ord('-'),0)
+	if precision == 0:
+		return(I)
+
+	frac = v%sc
+	F = np.empty((len(x),precision+1),dtype=np.uint8)
+	F[:,0] = ord('.')
+	for j in range(precision):
+		F[:,precision-j] = frac%10+48
+		frac = frac//10
+
+	return(np.hstack([I,F]))
+
+def format_psi_rows(index,values,precision):
+	'''
+	Format rows of a psi file with the index followed by each value at a fixed precision, separated by spaces
+
+	All rows are formatted at once in a byte array and the padding is removed in a single step
+
+	:param np.array index: Array of integer point ids
+	:param np.array values: Array of shape (points,columns)
+	:param int precision: Number of decimals
+	:returns: Bytes of the formatted rows, or None if a value cannot be formatted by :py:func:`format_fixed_bytes`
+	'''
+
+	n = len(index)
+	sep = np.full((n,1),ord(' '),dtype=np.uint8)
+
+	blocks = [format_int_bytes(index)]
+	for c in range(values.shape[1]):
+		col = format_fixed_bytes(values[:,c],precision)
+		if col is None:
+			return(None)
+		blocks += [sep,col]
+	blocks.append(np.full((n,1),ord('\n'),dtype=np.uint8))
+
+	M = np.hstack(blocks)
+	return(M[M != 0].tobytes())
+
+def psi_summary(df,mm=None):
+	'''
+	Summarize the points of a sample so that the range of the data can be found without reading the psi file
+
+	:param pd.DataFrame df: dataframe containing columns x,y,z and optionally ac,r,theta
+	:param array mm: (or None) Coefficients of the math model
+	:returns: Dictionary with the number of points `n`, a list of the minimum and maximum value of ac, r and theta, and the coefficients `mm`
+	'''
+
+	D = {'n':int(df.count()['x'])}
+
+	for c in ['ac','r','theta']:
+		if c in df.columns:
+			D[c] = [float(df[c].min()),float(df[c].max())]
+
+	if mm is not None:
+		D['mm'] = [float(c) for c in mm]
+
+	return(D)
+
+def summary_path(filepath):
+	'''
+	:param str filepath: Complete filepath to a psi file
+	:returns: Complete filepath to the summary of the psi file, e.g. AT_01_AT_summary.json for AT_01_AT.psi or AT_01_AT_gz_summary.json for AT_01_AT.psi.gz
+	'''
+
+	return(psi_stem(filepath)+'_summary.json')
+
+def write_summary(filepath,summary):
+	'''
+	Save the summary of a psi file created by :py:func:`psi_summary` to :py:func:`summary_path`
+
+	The size and modification time of the psi file are added to the summary, so it must be saved after the psi file is closed
+
+	:param str filepath: Complete filepath to the psi file
+	:param dict summary: Dictionary from :py:func:`psi_summary`
+	'''
+
+	st = os.stat(filepath)
+	summary = dict(summary,size=st.st_size,mtime_ns=st.st_mtime_ns)
+
+	with open(summary_path(filepath),'w') as f:
+		json.dump(summary,f)
+
+def read_psi_summary(filepath):
+	'''
+	Read the summary saved next to a psi file by :py:func:`write_data`
+
+	:param str filepath: Complete filepath to the psi file
+	:returns: Dictionary from :py:func:`psi_summary` or None if the psi file has no summary or has changed since the summary was saved
+	'''
+
+	path = summary_path(filepath)
+	if not os.path.isfile(path):
+		return(None)
+
+	with open(path) as f:
+		summary = json.load(f)
+
+	#Ranges and block offsets of a file rewritten by other tools no longer describe the file
+	st = os.stat(filepath)
+	if summary.get('size') != st.st_size or summary.get('mtime_ns') != st.st_mtime_ns:
+		return(None)
+
+	return(summary)
+
+#Identifies binary psi files and the version of the layout
+BINARY_MAGIC = b'PSIBIN01'
+
+def binary_path(filepath):
+	'''
+	:param str filepath: Complete filepath to a psi file
+	:returns: Complete filepath to the binary copy of the psi file, e.g. AT_01_AT.psib for AT_01_AT.psi or AT_01_AT_gz.psib for AT_01_AT.psi.gz
+	'''
+
+	return(psi_stem(filepath)+'.psib')
+
+def write_binary(filepath,df):
+	'''
+	Write the columns of a psi file as contiguous binary blocks that can be read with :py:func:`read_binary` without parsing text
+
+	The file starts with :py:data:`BINARY_MAGIC` and the length of a json header that describes the number of points and the columns. The index is saved as a block of int64 and the remaining columns as a single float64 array with one row per column, aligned to 64 bytes.
+
+	:param str filepath: Complete filepath to the psi file, the binary copy is written to :py:func:`binary_path`
+	:param pd.DataFrame df: dataframe containing columns x,y,z and optionally ac,r,theta
+	'''
+
+	if set(['ac','theta','r']).issubset(df.columns):
+		columns = ['x','y','z','ac','theta','r']
+	else:
+		columns = ['x','y','z']
+
+	n = len(df.index)
+	header = json.dumps({'n':n,'index':'i','columns':columns}).encode()
+
+	#Pad the header so that the data starts at a multiple of 64 bytes
+	start = len(BINARY_MAGIC)+8+len(header)
+	pad = (-start)%64
+
+	with open(binary_path(filepath),'wb') as f:
+		f.write(BINARY_MAGIC)
+		f.write(np.uint64(len(header)+pad).tobytes())
+		f.write(header+b' '*pad)
+		f.write(np.ascontiguousarray(df.index.values,dtype='<i8').tobytes())
+		f.write(np.ascontiguousarray(df[columns].values.T,dtype='<f8').tobytes())
+
+def read_binary(path):
+	'''
+	Open a file written by :py:func:`write_binary` with :py:func:`np.memmap` so that columns are read from disk when they are used
+
+	The memory map is opened copy on write, so changes to the dataframe are not saved to the file
 
-	def calc_variance(self,anum,tstep,percbins,rnull):
-		'''
-		Calculate the variance between samples according to bin position and variance between adjacent bins 
+	:param str path: Complete filepath to the binary file
+	:returns: pd.DataFrame with the columns of :py:func:`read_psi`
+	'''
 
-		:param int anum: Number of bins which the arclength axis should be divided into
-		:param float tstep: The size of each bin used for alpha
-		:param dict dfs: Dictionary of dfs which are going to be processed
-		:param list percbins: (or None) Must be a list of integers between 0 and 100 
-		:param int rnull: (or None) When the r value cannot be calculated it will be set to this value
-		'''
+	with open(path,'rb') as f:
+		if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+			raise ValueError(path+' is not a binary psi file')
+		hlen = int(np.frombuffer(f.read(8),dtype='<u8')[0])
+		header = json.loads(f.read(hlen).decode())
 
-		#Set up bins
-		lm = landmarks(percbins=percbins,rnull=rnull)
-		lm.calc_bins(self.dfs.values(),anum,tstep)
+	n,columns = header['n'],header['columns']
+	offset = len(BINARY_MAGIC)+8+hlen
 
-		#Calculate landmarks
-		outlm = pd.DataFrame()
-		for k in self.dfs.keys():
-			outlm = lm.calc_perc(self.dfs[k],k,'s',outlm)
+	i = np.memmap(path,dtype='<i8',mode='c',offset=offset,shape=(n,))
+	data = np.memmap(path,dtype='<f8',mode='c',offset=offset+8*n,shape=(len(columns),n))
 
-		#Convert to arr for variance calculations
-		lmarr,arr = convert_to_arr(lm.acbins,lm.tbins,outlm)
-		self.Llm.append(lmarr)
+	#The transposed array is used by the dataframe without copying
+	df = pd.DataFrame(data.T,columns=columns,copy=False)
+	df.insert(0,header['index'],i)
 
-		#Calculate variance between samples
-		svar = np.var(lmarr,axis=2)
+	return(df)
 
-		#Calculate variance between bins
-		Lvar = []
-		for i in range(1,len(lm.acbins-2)):
-			for t in range(0,len(lm.tbins)):
-				Lvar.append(np.var(lmarr[i-1:i+2,t],axis=0))
+def psi_layout(filepath):
+	'''
+	Read the header of a psi file to find the first line of data and the name of each column
 
-		self.Lsv.append(svar)
-		self.Msv.append(np.mean(svar))
-		self.Lbv.append(np.array(Lvar))
-		self.Mbv.append(np.mean(np.array(Lvar)))
+	Files written by :py:func:`write_data` declare r before theta in the header, but the data is written as ac,theta,r, so this header is read in the order of the data. Names are only given to the columns that are present in the data, e.g. files with only x,y,z.
 
-		print(anum,'calculation complete')
+	:param str filepath: Complete filepath to file
+	:returns: Number of lines before the data and list of column names, with 'Id' named 'i'
+	'''
 
-	def param_sweep(self,tstep,amn=2,amx=50,step=1,percbins=[50],rnull=15):
-		'''
-		Calculate landmarks for each value of anum specified in input range
+	names = {}
+	nhead = 0
+	with open_psi(filepath) as f:
+		line = f.readline()
+		while line.startswith('#'):
+			m = re.match(r'#\s*column\[(\d+)\]\s*=\s*"(.*)"',line)
+			if m:
+				names[int(m.group(1))] = m.group(2)
+			nhead += 1
+			line = f.readline()
 
-		:param int amn: The minimum number of alpha bins that should be considered
-		:param int amx: The maximum number of alpha bins that should be considered
-		:param int step: The step size in the range of amn to amx
-		'''
+		#Skip the line with the number of points and the transformation matrix
+		for i in range(3):
+			f.readline()
+		ncol = len(f.readline().split())
 
-		for a in np.arange(amn,amx,step):
-			self.calc_variance(a,tstep,percbins,rnull)
+	names = [names[i] for i in sorted(names.keys())]
+	names = ['i' if n == 'Id' else n for n in names]
 
-		print('Parameter sweep complete')
+	if names == ['i','x','y','z','ac','r','theta']:
+		names = ['i','x','y','z','ac','theta','r']
+	elif len(names) == 0:
+		names = ['i','x','y','z','ac','theta','r']
 
-	def plot_rawdata(self):
-		'''
-		Plot raw data from parameter sweep
-		'''
-		x = np.arange(2,len(self.Lsv))
-		fig,ax = plt.subplots()
+	if ncol > 0:
+		names = names[:ncol]
 
-		ax.plot(x,self.Mbv[2:],c='b',ls='--',label='Raw Bin Variance')
-		ax.plot(x,self.Msv[2:],c='g',ls='--',label='Raw Sample Variance')
+	return(nhead+4,names)
 
-		ax.legend()
-		ax.set_xlabel('Number of Alpha Bins')
-		ax.set_ylabel('Relative Variance')
+def psi_dtypes(names,dtype=None):
+	'''
+	:param list names: List of column names
+	:param dtype: (or None) Type of the value columns, float64 by default
+	:returns: Dictionary of the type of each column, the point id 'i' is always int64
+	'''
 
-	def plot_fitted(self,dof):
-		'''
-		Plot polynomial fits over the raw data
+	if dtype == None:
+		dtype = np.float64
 
-		:param int dof: Degree of the polynomial function to be fit
-		'''
+	return(dict((c,np.int64 if c == 'i' else dtype) for c in names))
 
-		x = np.arange(2,len(self.Lsv))
-		fig,ax = plt.subplots()
+def read_psi(filepath,columns=None,dtype=None,ac_range=None):
+	'''
+	Reads psi file at the given filepath and returns data in a pandas DataFrame
 
-		ax.plot(x,self.Mbv[2:],c='b',ls='--',label='Raw Bin Variance')
-		ax.plot(x,self.Msv[2:],c='g',ls='--',label='Raw Sample Variance')
+	The first line of data and the column names are read from the header with :py:func:`psi_layout`. Only the columns listed in `columns` are parsed, e.g. ['ac','r','theta'] for landmarks.
 
-		pbv = np.polyfit(x,self.Mbv[2:],dof)
-		fbv = np.poly1d(pbv)
-		ax.plot(x,fbv(x),c='b',label='Fit Bin Variance')
+	Files ending in a compression extension of :py:data:`PSI_CODECS`, e.g. .psi.gz, are decompressed as they are parsed
 
-		psv = np.polyfit(x,self.Msv[2:],dof)
-		fsv = np.poly1d(psv)
-		ax.plot(x,fsv(x),c='g',label='Fit Sample Variance')
+	If a binary copy written by :py:func:`write_binary` exists and is not older than the psi file, it is read with :py:func:`read_binary` instead of parsing the text
 
-		ax.legend()
-		ax.set_xlabel('Number of Alpha Bins')
-		ax.set_ylabel('Relative Variance')
+	:param str filepath: Complete filepath to file
+	:param list columns: (or None) List of columns to read, all columns by default
+	:param dtype: (or None) Type of the value columns, e.g. np.float32, float64 by default
+	:param tuple ac_range: (or None) Minimum and maximum value of ac, only points with lo <= ac <= hi are returned. Files written with `sort_ac` only read the blocks that overlap the range
+	:returns: pd.Dataframe containing data
+	'''
 
-	def find_optimum_anum(self,dof,guess):
-		'''
-		Calculate optimum anum and plot
+	summary = None
+	if ac_range != None:
+		summary = read_psi_summary(filepath)
+		if columns != None and 'ac' not in columns:
+			return(read_psi(filepath,columns+['ac'],dtype,ac_range)[columns])
 
-		:param int dof: Degree of the polynomial function to be fit
-		:param int guess: Best guess of the optimum anum, which cannot be less than the maximum bin variance
-		'''
+	bpath = binary_path(filepath)
+	if os.path.isfile(bpath) and os.path.getmtime(bpath) >= os.path.getmtime(filepath):
+		df = read_binary(bpath)
 
-		x = np.arange(2,len(self.Lsv))
-		fig,ax = plt.subplots()
+		#Slice sorted data without reading the points outside of the range
+		if ac_range != None and summary != None and summary.get('sort') == 'ac':
+			lo,hi = np.searchsorted(df.ac.values,ac_range[0],'left'),np.searchsorted(df.ac.values,ac_range[1],'right')
+			df = df.iloc[lo:hi]
 
-		pbv = np.polyfit(x,normalize(self.Mbv[2:])[0],dof)
-		fbv = np.poly1d(pbv)
-		ax.plot(x,fbv(x),c='b',label='Bin Variance')
+		if columns != None:
+			df = df[columns]
+		if dtype != None:
+			df = df.astype(psi_dtypes(df.columns,dtype),copy=False)
 
-		psv = np.polyfit(x,normalize(self.Msv[2:])[0],dof)
-		fsv = np.poly1d(psv)
-		ax.plot(x,fsv(x),c='g',label='Sample Variance')
+	else:
+		skip,names = psi_layout(filepath)
+		usecols = names if columns == None else [c for c in names if c in columns]
 
-		opt = minimize(fbv+fsv,guess)
-		ax.axvline(opt.x,c='r',label='Optimum: '+str(np.round(opt.x[0],2)))
+		#Seek to the overlapping blocks if the file is sorted and uncompressed, otherwise filter a complete read
+		blocks = summary.get('blocks') if summary != None else None
+		if ac_range != None and blocks and None not in [b[2] for b in blocks]:
+			df = read_psi_blocks(filepath,blocks,ac_range,names,usecols,psi_dtypes(usecols,dtype))
+		else:
+			df = pd.read_csv(filepath,
+				sep=' ',
+				header=None,
+				skiprows=skip,
+				names=names,
+				usecols=usecols,
+				dtype=psi_dtypes(usecols,dtype),
+				engine='c')
 
-		ax.legend()
-		ax.set_xlabel('Number of Alpha Bins')
-		ax.set_ylabel('Relative Variance')
+		if columns != None:
+			df = df[columns]
 
-P = {
-	'zln':2,'zpt':3,'zfb':1,
-	'wtc':'b','mtc':'r',
-	'alpha':0.3,
-	'cmap':'Greys_r',
-	'xarr':None,
-	'tarr':None
-}
+	if ac_range != None:
+		df = df[(df.ac >= ac_range[0]) & (df.ac <= ac_range[1])]
 
-def subplot_lmk(ax,p,avg,sem,parr,xarr,tarr,dtype,Pn=P):
-	'''
-	Plot a ribbon of average and standard error of the mean onto the subplot, `ax`
+	return(df)
 
-	:param plt.Subplot ax: Matplotlib subplot onto which the data should be plotted
-	:param list p: List of two theta values that should be plotted
-	:param np.array avg: Array of shape (xvalues,tvalues) containing the average values of the data
-	:param np.array sem: Array of shape (xvalues,tvalues) containing the standard error of the mean values of the data
-	:param np.array parr: Array of shape (xvalues,tvalues) containing the p values for the data
-	:param str dtype: String describing sample type
-	:param Pn: Dictionary containing the following values: 'zln':2,'zpt':3,'zfb':1,'wtc':'b','mtc':'r','alpha':0.3,'cmap':'Greys_r'
-	:type: dict or None
+def read_psi_blocks(filepath,blocks,ac_range,names,usecols,dtypes):
+	'''
+	Read the blocks of a psi file sorted by ac that overlap a range of ac
+
+	:param str filepath: Complete filepath to an uncompressed psi file written with `sort_ac`
+	:param list blocks: List of the minimum ac, maximum ac, byte offset and number of points of each block from :py:func:`read_psi_summary`
+	:param tuple ac_range: Minimum and maximum value of ac
+	:param list names: List of the names of all columns from :py:func:`psi_layout`
+	:param list usecols: List of columns to read
+	:param dict dtypes: Dictionary of the type of each column in `usecols`
+	:returns: pd.DataFrame with the points of the overlapping blocks
 	'''
 
-	for k in Pn.keys():
-		P[k] = Pn[k]
+	#Blocks are sorted, so the overlapping blocks are contiguous
+	hit = [b for b in blocks if b[1] >= ac_range[0] and b[0] <= ac_range[1]]
+	if len(hit) == 0:
+		return(pd.DataFrame(dict((c,pd.Series(dtype=dtypes[c])) for c in usecols)))
+
+	with open(filepath,'rb') as f:
+		f.seek(hit[0][2])
+		df = pd.read_csv(f,
+			sep=' ',
+			header=None,
+			names=names,
+			usecols=usecols,
+			dtype=dtypes,
+			nrows=sum([b[3] for b in hit]),
+			engine='c')
+
+	#Match the row numbers of a complete read
+	df.index = df.index+sum([b[3] for b in blocks[:blocks.index(hit[0])]])
 
-	if dtype=='wt':
-		c = P['wtc']
-	else:
-		c = P['mtc']
+	return(df)
 
-	ti1 = np.where(tarr==p[0])[0][0]
-	ti2 = np.where(tarr==p[1])[0][0]
+def read_psi_chunks(filepath,chunksize=100000,columns=None,dtype=None):
+	'''
+	Read a psi file in chunks of rows with the columns named as in :py:func:`read_psi`
 
-	ax.fill_between(xarr,avg[:,ti1]+sem[:,ti1],avg[:,ti1]-sem[:,ti1],alpha=P['alpha'],color=c,zorder=P['zfb'])
-	ax.fill_between(xarr,-avg[:,ti2]+sem[:,ti2],-avg[:,ti2]-sem[:,ti2],alpha=P['alpha'],color=c,zorder=P['zfb'])
+	:param str filepath: Complete filepath to file
+	:param int chunksize: (or None) Number of rows in each chunk
+	:param list columns: (or None) List of columns to read, all columns by default
+	:param dtype: (or None) Type of the value columns, float64 by default
+	:returns: Iterator of pd.DataFrame
+	'''
 
-	ax.plot(xarr,avg[:,ti1],c=c,zorder=P['zln'])
-	ax.plot(xarr,-avg[:,ti2],c=c,zorder=P['zln'])
+	skip,names = psi_layout(filepath)
+	usecols = names if columns == None else [c for c in names if c in columns]
 
-	if dtype=='mt':
-		ax.scatter(xarr,avg[:,ti1],c=parr[:,ti1],cmap=P['cmap'],zorder=P['zpt'])
-		ax.scatter(xarr,-avg[:,ti2],c=parr[:,ti2],cmap=P['cmap'],zorder=P['zpt'])
+	reader = pd.read_csv(filepath,sep=' ',header=None,skiprows=skip,names=names,
+		usecols=usecols,dtype=psi_dtypes(usecols,dtype),engine='c',chunksize=chunksize)
 
-##### PSI file processing ############
+	for df in reader:
+		if columns != None:
+			df = df[columns]
+		yield df
 
-def write_header(f):
+def psi_files(directory,dtype):
 	'''
-	Writes header for PSI file with columns Id,x,y,z,ac,r,theta
+	Find the psi files in a directory with filtering based on dtype
 
-	:param file f: file object created by 'open(filename,'w')`
+	:param str directory: Directory to get psis from 
+	:param str dtype: Usually 'AT' or 'ZRF1'
+	:returns: List of tuples of the sample number and the complete filepath, sorted by filename
 	'''
 
-	contents = [
-		'PSI Format 1.0',
-		'',
-		'column[0] = "Id"',
-		'column[1] = "x"',
-		'column[2] = "y"',
-		'column[3] = "z"',
-		'column[4] = "ac"',
-		'symbol[4] = "A"',
-		'type[4] = float',
-		'column[5] = "r"',
-		'symbol[5] = "R"',
-		'type[5] = float',
-		'column[6] = "theta"',
-		'symbol[6] = "T"',
-		'type[6] = float'
-	]
+	L = []
+	for f in sorted(os.listdir(directory)):
+		if dtype in f and is_psi(f):
+			num = re.findall(r'\d+',f.split('.')[0])[0]
+			L.append((num,os.path.join(directory,f)))
 
-	for line in contents:
-		f.write('# '+ line + '\n')
+	return(L)
 
-def write_data(filepath,df):
+def read_psi_to_dict(directory,dtype,columns=None,n_jobs=None,backend='thread',progress=None):
 	'''
-	Writes data in PSI format to file after writing header using :py:func:`write_header`. Closes file at the conclusion of writing data.
+	Read psis from directory into dictionary of dfs with filtering based on dtype
 
-	:param str filepath: Complete filepath to output file
-	:param pd.DataFrame df: dataframe containing columns x,y,z,ac,r,theta
+	Files are read in parallel when `n_jobs` is greater than 1. Files with a binary copy (:py:func:`write_binary`) are memory mapped in this process, since sending them from a worker would copy the data
+
+	:param str directory: Directory to get psis from 
+	:param str dtype: Usually 'AT' or 'ZRF1'
+	:param list columns: (or None) List of columns to read, e.g. ['ac','r','theta'] for landmarks, all columns by default
+	:param int n_jobs: (or None) Number of workers reading files at the same time, files are read one at a time by default
+	:param str backend: (or None) Either 'thread' (default) or 'process'
+	:param progress: (or None) Function called as progress(num,done,total) after each file is read. The sample number is printed by default
+	:returns: Dictionary of pd.DataFrame ordered by filename
 	'''
 
-	#Open new file at given filepath
-	f = open(filepath,'w')
+	if progress == None:
+		progress = lambda num,done,total: print(num)
 
-	#Write header contents to file
-	write_header(f)
+	files = psi_files(directory,dtype)
+	read = partial(read_psi,columns=columns)
+	results = {}
 
-	n = df.count()['x']
-    
-	#Write line with sample number
-	f.write(str(n)+' 0 0\n')
+	#Binary copies and sequential reads are done in this process
+	local = [(num,path) for num,path in files if n_jobs == None or n_jobs == 1
+		or os.path.isfile(binary_path(path))]
+	remote = [(num,path) for num,path in files if (num,path) not in local]
 
-	#Write translation matrix
-	f.write('1 0 0\n'+
-			'0 1 0\n'+
-			'0 0 1\n')
+	for num,path in local:
+		results[path] = read(path)
+		progress(num,len(results),len(files))
 
-	#Write dataframe to file using pandas to_csv function to format
-	try:
-		f.write(df[['x','y','z','ac','theta','r']].to_csv(sep=' ', index=True, header=False))
-	except:
-		f.write(df[['x','y','z']].to_csv(sep=' ', index=True, header=False))
+	if len(remote) > 0:
+		if backend == 'process':
+			executor = cf.ProcessPoolExecutor(n_jobs)
+		else:
+			executor = cf.ThreadPoolExecutor(n_jobs)
 
-	f.close()
+		with executor:
+			futures = dict((executor.submit(read,path),(num,path)) for num,path in remote)
+			for fut in cf.as_completed(futures):
+				num,path = futures[fut]
+				results[path] = fut.result()
+				progress(num,len(results),len(files))
 
-	print('Write to',filepath,'complete')
+	dfs = {}
+	for num,path in files:
+		dfs[num] = results[path]
+
+	return(dfs)
 
-def read_psi(filepath):
+class psi_dict(Mapping):
 	'''
-	Reads psi file at the given filepath and returns data in a pandas DataFrame
+	Dictionary of the psis in a directory, with the keys of :py:func:`read_psi_to_dict`, that reads each sample when it is accessed
 
-	:param str filepath: Complete filepath to file
-	:returns: pd.Dataframe containing data
+	Samples that have been read are kept in memory until their total size exceeds `max_bytes`, and then the least recently used samples are removed. Listing the keys does not read any files.
+
+	:param str directory: Directory to get psis from 
+	:param str dtype: Usually 'AT' or 'ZRF1'
+	:param int max_bytes: (or None) Maximum memory used by samples that are kept, no limit by default. The sample that was accessed last is always kept
+	:param list columns: (or None) List of columns to read, all columns by default
+
+	.. py:attribute:: psi_dict.files
+
+		OrderedDict of the complete filepath of each sample number
 	'''
 
-	df = pd.read_csv(filepath,
-		sep=' ',
-		header=19)
+	def __init__(self,directory,dtype,max_bytes=None,columns=None):
 
-	if len(df.columns) <= 4:
-		df.columns = ['i','x','y','z']
-	elif len(df.columns) >= 6:
-		df.columns=['i','x','y','z','ac','theta','r']
+		self.files = OrderedDict(psi_files(directory,dtype))
+		self.max_bytes = max_bytes
+		self.columns = columns
 
-	return(df)
+		self.loaded = OrderedDict()
+		self.nbytes = 0
+
+	def __getitem__(self,key):
+
+		if key in self.loaded:
+			self.loaded.move_to_end(key)
+			return(self.loaded[key])
+
+		df = read_psi(self.files[key],columns=self.columns)
+		self.loaded[key] = df
+		self.nbytes += int(df.memory_usage(index=True).sum())
+		self.evict()
+
+		return(df)
+
+	def __iter__(self):
+		return(iter(self.files))
 
-def read_psi_to_dict(directory,dtype):
+	def __len__(self):
+		return(len(self.files))
+
+	def __contains__(self,key):
+		return(key in self.files)
+
+	def evict(self):
+		'''
+		Remove the least recently used samples until the samples in memory are smaller than :py:attr:`psi_dict.max_bytes`
+		'''
+
+		if self.max_bytes == None:
+			return
+
+		while self.nbytes > self.max_bytes and len(self.loaded) > 1:
+			key,df = self.loaded.popitem(last=False)
+			self.nbytes -= int(df.memory_usage(index=True).sum())
+
+def read_summary_dict(directory,dtype):
 	'''
-	Read psis from directory into dictionary of dfs with filtering based on dtype
+	Read the summaries of psis in a directory into a dictionary with the same keys as :py:func:`read_psi_to_dict`
+
+	The summaries can be passed to :py:func:`landmarks.calc_bins` instead of the dataframes. Psi files without a summary are summarized by reading the file.
 
 	:param str directory: Directory to get psis from 
 	:param str dtype: Usually 'AT' or 'ZRF1'
-	:returns: Dictionary of pd.DataFrame
+	:returns: Dictionary of summaries from :py:func:`psi_summary`
 	'''
 
-	dfs = {}
-	for f in os.listdir(directory):
-		if dtype in f:
-			df = read_psi(os.path.join(directory,f))
-			num = re.findall(r'\d+',f.split('.')[0])[0]
-			print(num)
-			dfs[num] = df
+	sums = {}
+	for num,path in psi_files(directory,dtype):
+		sums[num] = read_psi_summary(path)
+		if sums[num] == None:
+			sums[num] = psi_summary(read_psi(path))
 
-	return(dfs)
+	return(sums)
+
+class point_store:
+	'''
+	HDF5 file that holds the points of every sample in an experiment, with a group for each channel
+
+	Each column of a channel is a single dataset with the points of all samples concatenated. The offset and length of each sample in the columns and the metadata of each sample (e.g. from :py:func:`psi_summary`) are saved in an index next to the columns, so samples can be appended as they are processed and a subset of samples and columns can be read without opening every psi file.
+
+	:param str filepath: Complete filepath to the HDF5 file
+	:param str mode: (or None) Mode passed to :py:class:`h5py.File`, 'a' by default to create the file or append to it. Unless the mode is 'r', each channel is truncated with :py:func:`point_store.truncate` when the file is opened
+
+	.. py:attribute:: point_store.f
+
+		Open :py:class:`h5py.File`
+	'''
+
+	def __init__(self,filepath,mode='a'):
+
+		self.f = h5py.File(filepath,mode)
+
+		#Remove points of an append that was interrupted before its index entry was written
+		if mode != 'r':
+			for channel in self.channels():
+				self.truncate(channel)
+
+	def __enter__(self):
+		return(self)
+
+	def __exit__(self,*args):
+		self.close()
+
+	def close(self):
+		'''
+		Close the HDF5 file
+		'''
+
+		self.f.close()
+
+	def channels(self):
+		'''
+		:returns: List of channel names in the store
+		'''
+
+		return(list(self.f.keys()))
+
+	def samples(self,channel):
+		'''
+		:param str channel: Name of the channel
+		:returns: List of sample identifiers in the order they were added
+		'''
+
+		g = self.f[channel]
+		return([s.decode() if type(s) == bytes else s for s in g['samples'][:g['length'].shape[0]]])
+
+	def end(self,channel):
+		'''
+		:param str channel: Name of the channel
+		:returns: Number of points of the samples in the index of the channel
+		'''
+
+		g = self.f[channel]
+		k = g['length'].shape[0]
+		if k == 0:
+			return(0)
+		return(int(g['offset'][k-1]+g['length'][k-1]))
+
+	def truncate(self,channel):
+		'''
+		Resize the index and the columns of a channel to the samples whose index entry is complete. The length of a sample is written last by :py:func:`point_store.append`, so any other data beyond it belongs to an append that did not finish
+
+		:param str channel: Name of the channel
+		'''
+
+		g = self.f[channel]
+		k = g['length'].shape[0]
+		for name in ['samples','meta','offset']:
+			if g[name].shape[0] != k:
+				g[name].resize((k,))
+
+		n = self.end(channel)
+		for c in g['columns']:
+			if g['columns/'+c].shape[0] != n:
+				g['columns/'+c].resize((n,))
+
+	def append(self,channel,sample,df,meta=None):
+		'''
+		Add the points of a sample to the end of the columns of a channel
+
+		:param str channel: Name of the channel, e.g. 'AT'
+		:param str sample: Sample identifier, e.g. the sample number
+		:param pd.DataFrame df: Dataframe containing columns x,y,z and optionally ac,r,theta. The index is saved as the point id 'i'
+		:param dict meta: (or None) Metadata of the sample, :py:func:`psi_summary` by default
+		'''
+
+		columns = [c for c in ['x','y','z','ac','r','theta'] if c in df.columns]
+		if meta == None:
+			meta = psi_summary(df)
+
+		g = self.f.require_group(channel)
+		if 'samples' not in g:
+			for name in ['samples','meta']:
+				g.create_dataset(name,(0,),maxshape=(None,),dtype=h5py.special_dtype(vlen=str))
+			for name in ['offset','length']:
+				g.create_dataset(name,(0,),maxshape=(None,),dtype='i8')
+			for c in ['i']+columns:
+				g.create_dataset('columns/'+c,(0,),maxshape=(None,),chunks=(2**16,),
+					dtype='i8' if c == 'i' else 'f8')
+
+		if str(sample) in self.samples(channel):
+			raise ValueError('Sample '+str(sample)+' is already in channel '+channel)
+		if sorted(g['columns'].keys()) != sorted(['i']+columns):
+			raise ValueError('Columns of sample '+str(sample)+' do not match channel '+channel)
+
+		#Add points after the last indexed sample
+		start,n = self.end(channel),len(df.index)
+		for c in ['i']+columns:
+			ds = g['columns/'+c]
+			ds.resize((start+n,))
+			ds[start:] = df.index.values if c == 'i' else df[c].values
+
+		#Add the sample to the index, with its length last so the entry only counts once it is complete
+		k = g['length'].shape[0]
+		for name,v in [('samples',str(sample)),('meta',json.dumps(meta)),('offset',start),('length',n)]:
+			g[name].resize((k+1,))
+			g[name][k] = v
+
+	def index(self,channel):
+		'''
+		:param str channel: Name of the channel
+		:returns: pd.DataFrame indexed by sample with the offset and length of each sample in the columns
+		'''
+
+		g = self.f[channel]
+		k = g['length'].shape[0]
+		return(pd.DataFrame({'offset':g['offset'][:k],'length':g['length'][:]},
+			index=self.samples(channel)))
+
+	def metadata(self,channel,sample):
+		'''
+		:param str channel: Name of the channel
+		:param str sample: Sample identifier
+		:returns: Dictionary of metadata saved with the sample
+		'''
+
+		k = self.samples(channel).index(str(sample))
+		m = self.f[channel]['meta'][k]
+		return(json.loads(m.decode() if type(m) == bytes else m))
+
+	def read(self,channel,samples=None,columns=None):
+		'''
+		Read a subset of samples and columns of a channel
+
+		:param str channel: Name of the channel
+		:param list samples: (or None) List of sample identifiers, all samples by default
+		:param list columns: (or None) List of columns, e.g. ['ac','r','theta'], all columns by default
+		:returns: Dictionary of pd.DataFrame with the columns of :py:func:`read_psi` for each sample
+		'''
+
+		g = self.f[channel]
+		idx = self.index(channel)
+		if samples == None:
+			samples = list(idx.index)
+		if columns == None:
+			columns = [c for c in ['i','x','y','z','ac','theta','r'] if c in g['columns']]
+
+		dfs = {}
+		for sm in samples:
+			o,n = idx.loc[str(sm)]
+			dfs[str(sm)] = pd.DataFrame(dict((c,g['columns/'+c][o:o+n]) for c in columns),columns=columns)
+
+		return(dfs)
 
 ###### Stand alone functions
 
@@ -1388,15 +3946,16 @@ def calculate_models(Ldf):
 	:returns: pd.Dataframe with a,b,c values for parabolic model
 	'''
 
-	modeldf = pd.DataFrame({'a':[],'b':[],'c':[]})
+	L = []
 
 	for df in Ldf:
-		s = cranium.brain()
+		#Model is fit by add_aligned_df
+		s = brain()
 		s.add_aligned_df(df)
-		s.fit_model(s.df_align,2)
 
-		modeldf = modeldf.append(pd.DataFrame({'a':[s.mm.cf[0]],'b':[s.mm.cf[1]],'c':[s.mm.cf[2]]}))
+		L.append(s.mm.cf)
 
+	modeldf = pd.DataFrame(np.reshape(L,(-1,3)),columns=['a','b','c'])
 	return(modeldf)
 
 def generate_kde(data,var,x,absv=False):
@@ -1478,7 +4037,7 @@ def rescale_variable(Ddfs,var,newvar):
 		dfmin = dfmin.join(pd.DataFrame({newvar:y/np.abs(mi)}))
 		dfmax = dfmax.join(pd.DataFrame({newvar:y/np.abs(ma)}))
 
-		dfout = dfmin.append(dfmax)
+		dfout = pd.concat([dfmin,dfmax])
 		Dout[key] = dfout
 
 	return(Dout)
\ No newline at end of file
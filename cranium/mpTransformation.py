@@ -3,9 +3,11 @@ import multiprocessing as mp
 import time
 import os
 from functools import partial
-from sys import argv
+import argparse
 import re
 import json
+import sys
+import traceback
 
 class paramsClass:
 	'''
@@ -28,13 +30,16 @@ class paramsClass:
 
 	def add_outdir(self,path):
 		'''
-		Add out directory as an attribute of the class
+		Add out directory as an attribute of the class and place the point store in it if the store is not a complete path
 
 		:param str path: Complete path to the output directory
 		'''
 
 		self.outdir = path
 
+		if self.store != None:
+			self.store = os.path.join(path,self.store)
+
 	def check_config(self,D,path):
 		'''
 		Check that each parameter in the config file is correct and raise an error if it isn't
@@ -165,10 +170,64 @@ class paramsClass:
 			print('Specification for 2D transformation must be boolean. Modify in',path)
 			raise
 
+		#Check optional directory of alignment records from a previous run
+		if D.get('aligndir','') == '':
+			self.aligndir = None
+		elif os.path.isdir(D['aligndir']):
+			self.aligndir = D['aligndir']
+		else:
+			print('Alignment directory path (aligndir) must specify an existing directory. Modify in',path)
+			raise
+
+		#Check optional filename of a point store that each sample is added to
+		if D.get('store','') == '':
+			self.store = None
+		elif type(D['store']) == str:
+			self.store = D['store']
+		else:
+			print('Point store (store) must be a filename. Modify in',path)
+			raise
+
 		self.scale = [1,1,1]
 
 		print('All parameter inputs are correct')
 
+#Lock shared by the processes of the pool so that one sample at a time is added to the point store
+store_lock = None
+
+def init_lock(lock):
+	'''
+	Store the lock for the point store in each process of the pool
+
+	:param mp.Lock lock: Lock created by the main process
+	'''
+
+	global store_lock
+	store_lock = lock
+
+def sample_size(num,P):
+	'''
+	Total size of the hdf5 files of every channel of a sample, which is used to start the largest samples first
+
+	:param int num: Index of the file in each channel directory
+	:param :class:`paramClass` P: Object containing all variables from config file
+	:returns: Size in bytes
+	'''
+
+	size = os.path.getsize(os.path.join(P.c1_dir,P.c1_files[num]))
+	for i in range(len(P.Lcdir)):
+		size += os.path.getsize(os.path.join(P.Lcdir[i],P.Lcfiles[i][num]))
+
+	return(size)
+
+def sample_number(filename):
+	'''
+	:param str filename: Name of an image file, e.g. AT_01_Probabilities.h5
+	:returns: First number in the filename as a string, e.g. '01'
+	'''
+
+	return(re.findall(r'\d+',filename.split('.')[0])[0])
+
 def check_nums(P):
 	'''
 	Check that the numbers of files selected by the same list index match
@@ -179,7 +238,7 @@ def check_nums(P):
 	Lnums = []
 
 	for i,f in enumerate(P.c1_files):
-		n = re.findall(r'\d+',f.split('.')[0])[0]
+		n = sample_number(f)
 		for Lf in P.Lcfiles:
 			if n not in Lf[i]:
 				print('File numbers are mismatched between channel directories.')
@@ -188,6 +247,17 @@ def check_nums(P):
 
 	return(Lnums)
 
+def save_store(e,path):
+	'''
+	Add every channel of a sample to the point store of the experiment
+
+	:param :class:`cranium.embryo` e: Embryo whose channels have been transformed
+	:param str path: Complete path to the point store
+	'''
+
+	with cranium.point_store(path) as store:
+		e.save_store(store)
+
 def process(num,P=None):
 	'''
 	Run through the processing steps for a single sample through saving psi files
@@ -199,7 +269,9 @@ def process(num,P=None):
 	tic = time.time()
 	print(num,'Starting sample')
 
-	e = cranium.embryo(P.expname,num,P.outdir)
+	#Name outputs and alignment records by the sample number, which does not depend on the order of the directory listing
+	source = P.c1_files[num]
+	e = cranium.embryo(P.expname,sample_number(source),P.outdir)
 
 	#Add channels and preprocess data
 	e.add_channel(os.path.join(P.c1_dir,P.c1_files[num]),P.c1_key)
@@ -208,24 +280,32 @@ def process(num,P=None):
 		e.add_channel(os.path.join(P.Lcdir[i],P.Lcfiles[i][num]),P.Lckey[i])
 		e.chnls[P.Lckey[i]].preprocess_data(P.genthresh,P.scale,P.microns)
 
-	#Calculate PCA transformation for structural channel, c1
-	if P.twoD == True:
-		e.chnls[P.c1_key].calculate_pca_median_2d(e.chnls[P.c1_key].raw_data,P.medthresh,P.radius,P.microns)
-		pca = e.chnls[P.c1_key].pcamed
-		e.chnls[P.c1_key].pca_transform_2d(e.chnls[P.c1_key].df_thresh,pca,P.comporder,P.fitdim,deg=P.deg)
-
-		#Transform additional channels
-		for i in range(len(P.Lcdir)):
-			e.chnls[P.Lckey[i]].pca_transform_2d(e.chnls[P.Lckey[i]].df_thresh,pca,P.comporder,P.fitdim,deg=P.deg)
+	#Apply a saved alignment record if one exists for this sample and keep a copy with the new outputs
+	if P.aligndir != None and os.path.isfile(e.alignment_path(P.aligndir)):
+		e.load_alignment(e.alignment_path(P.aligndir),source)
+		e.apply_alignment(P.c1_key)
+		e.write_alignment()
+		print(num,'Loaded alignment record')
 
 	else:
-		e.chnls[P.c1_key].calculate_pca_median(e.chnls[P.c1_key].raw_data,P.medthresh,P.radius,P.microns)
-		pca = e.chnls[P.c1_key].pcamed
-		e.chnls[P.c1_key].pca_transform_3d(e.chnls[P.c1_key].df_thresh,pca,P.comporder,P.fitdim,deg=P.deg)
+		#Calculate PCA transformation for structural channel, c1
+		if P.twoD == True:
+			e.chnls[P.c1_key].calculate_pca_median_2d(e.chnls[P.c1_key].raw_data,P.medthresh,P.radius,P.microns)
+			pca = e.chnls[P.c1_key].pcamed
+			e.chnls[P.c1_key].pca_transform_2d(e.chnls[P.c1_key].df_thresh,pca,P.comporder,P.fitdim,deg=P.deg)
+
+		else:
+			e.chnls[P.c1_key].calculate_pca_median(e.chnls[P.c1_key].raw_data,P.medthresh,P.radius,P.microns)
+			pca = e.chnls[P.c1_key].pcamed
+			e.chnls[P.c1_key].pca_transform_3d(e.chnls[P.c1_key].df_thresh,pca,P.comporder,P.fitdim,deg=P.deg)
 
-		#Transform additional channels
-		for i in range(len(P.Lcdir)):
-			e.chnls[P.Lckey[i]].pca_transform_3d(e.chnls[P.Lckey[i]].df_thresh,pca,P.comporder,P.fitdim,deg=P.deg)
+		e.save_alignment(P.c1_key,source)
+
+	#Transform additional channels with the alignment of the structural channel
+	e.transform = e.chnls[P.c1_key].transform
+	e.mm = e.chnls[P.c1_key].mm
+	for i in range(len(P.Lcdir)):
+		e.apply_alignment(P.Lckey[i])
 
 	print(num,'Starting coordinate transformation')
 	e.chnls[P.c1_key].transform_coordinates()
@@ -234,13 +314,41 @@ def process(num,P=None):
 
 	e.save_psi()
 
+	#Add the sample to the point store of the experiment
+	if P.store != None:
+		#Without the pool initializer the sample is not processed alongside others and no lock is needed
+		if store_lock != None:
+			with store_lock:
+				save_store(e,P.store)
+		else:
+			save_store(e,P.store)
+
 	toc = time.time()
 	print(num,'Complete',toc-tic)
 
+def run_sample(num,P=None):
+	'''
+	Run :py:func:`process` for a single sample and return its error instead of raising it, so that the other samples in the pool keep running
+
+	:param int num: Index of the file that is currently being processed
+	:param :class:`paramClass` P: Object containing all variables from config file
+	:returns: Tuple of `num` and the traceback of the error, which is None if the sample was processed
+	'''
+
+	try:
+		process(num,P)
+		return((num,None))
+	except Exception:
+		return((num,traceback.format_exc()))
+
 if __name__=='__main__':
 
-	f,config_path = argv
-	P = paramsClass(config_path)
+	parser = argparse.ArgumentParser(description='Transform every sample in the directories of a config file')
+	parser.add_argument('config',help='Complete path to the config file')
+	parser.add_argument('--jobs',type=int,default=None,help='Number of samples processed at a time, the number of cpus by default')
+	args = parser.parse_args()
+
+	P = paramsClass(args.config)
 
 	#Create out directory stamped with current date and time
 	outdir = os.path.join(P.rootdir,'Output'+time.strftime("%m-%d-%H-%M",time.localtime()))
@@ -248,18 +356,22 @@ if __name__=='__main__':
 	P.add_outdir(outdir)
 	print('outdir',outdir)
 
-	processfxn = partial(process,P=P)
+	processfxn = partial(run_sample,P=P)
 
+	#Start the largest samples first so that small samples fill in at the end
 	Lnums = check_nums(P)
-	n = len(Lnums)
-	# Initiate map pools in sets of 5 samples
-	for i in range(0,n,5):
-		if i+5>n:
-			L = Lnums[i:n]
-		else:
-			L = Lnums[i:i+5]
-
-		pool = mp.Pool()
-		pool.map(processfxn,L)
-		pool.close()
-		pool.join()
\ No newline at end of file
+	Lnums = sorted(Lnums,key=lambda num: sample_size(num,P),reverse=True)
+
+	#Use one pool for every sample and send each process a new sample as soon as it finishes one
+	#Errors are reported by sample so that one failed sample does not discard the others
+	lock = mp.Lock()
+	failed = []
+	with mp.Pool(args.jobs,initializer=init_lock,initargs=(lock,)) as pool:
+		for num,error in pool.imap_unordered(processfxn,Lnums):
+			if error != None:
+				print(num,'Failed',P.c1_files[num])
+				print(error)
+				failed.append(num)
+
+	if len(failed) > 0:
+		sys.exit('Failed samples '+', '.join([P.c1_files[num] for num in sorted(failed)]))
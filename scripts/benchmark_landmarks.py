@@ -0,0 +1,89 @@
+'''
+Benchmark landmark accumulation for an increasing number of samples
+
+Compares collecting a single row dataframe for each sample with landmarks.calc_perc and combining
+the rows once with landmarks.calc_tensor, which collects every sample in one array and creates the
+dataframe once. Adding each sample to a dataframe with landmarks.calc_perc is deprecated because it
+copies the dataframe for every sample. The time per sample should stay constant when accumulation is linear.
+
+Usage: python benchmark_landmarks.py [max number of samples]
+'''
+
+import cranium
+import numpy as np
+import pandas as pd
+import time
+from sys import argv
+
+def make_sample(rng,n=2000):
+	'''
+	Create a random sample with columns ac, theta and r
+
+	:param np.random.RandomState rng: Random number generator
+	:param int n: Number of points in the sample
+	:returns: pd.DataFrame
+	'''
+
+	return(pd.DataFrame({
+		'ac':rng.uniform(-100,100,n),
+		'theta':rng.uniform(-np.pi,np.pi,n),
+		'r':rng.gamma(2,5,n)
+		}))
+
+def time_accumulation(lm,dfs,batched):
+	'''
+	Calculate landmarks for each sample and time the accumulation into a single dataframe
+
+	:param landmarks lm: Landmark object with bins already calculated
+	:param dict dfs: Dictionary of samples
+	:param bool batched: Set to True to calculate all samples with landmarks.calc_tensor
+	:returns: Time in seconds
+	'''
+
+	tic = time.time()
+	if batched == True:
+		out = lm.calc_tensor(dfs,'wt').to_dataframe()
+	else:
+		out = []
+		for k in dfs.keys():
+			out = lm.calc_perc(dfs[k],k,'wt',out)
+		out = pd.concat(out)
+
+	return(time.time()-tic)
+
+if __name__=='__main__':
+
+	if len(argv) > 1:
+		nmax = int(argv[1])
+	else:
+		nmax = 1000
+
+	rng = np.random.RandomState(0)
+	pool = [make_sample(rng) for i in range(50)]
+
+	print('samples','landmarks','rows (s)','rows per sample (ms)','batched (s)','batched per sample (ms)')
+
+	n = 250
+	while n <= nmax:
+		dfs = dict((str(i),pool[i%len(pool)]) for i in range(n))
+
+		lm = cranium.landmarks(percbins=[10,50,90],rnull=15)
+		lm.calc_bins(pool,20,np.pi/2)
+
+		tc = time_accumulation(lm,dfs,False)
+		tb = time_accumulation(lm,dfs,True)
+		nlm = (len(lm.acbins)-1)*(len(lm.tbins)-1)*len(lm.percbins)
+
+		print(n,nlm,round(tc,2),round(1000*tc/n,2),round(tb,2),round(1000*tb/n,2))
+		n *= 2
+
+	#Convert a large set of landmarks to cartesian coordinates
+	for anum in [25,50,100]:
+		lm = cranium.landmarks(percbins=[10,50,90],rnull=15)
+		lm.calc_bins(pool,anum,np.pi/8)
+		wide = lm.calc_tensor(dict((str(i),df) for i,df in enumerate(pool)),'wt').to_dataframe()
+
+		tic = time.time()
+		cranium.reformat_to_cart(wide)
+		t = time.time()-tic
+		print('reformat_to_cart',len(wide.columns)//2,'landmarks',round(t,2),'s')
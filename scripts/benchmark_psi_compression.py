@@ -0,0 +1,74 @@
+'''
+Benchmark compressed psi files written with write_data and read with read_psi
+
+For each codec and compression level the file size is compared with the uncompressed psi file and the
+throughput is reported in MB/s of uncompressed text, so codecs can be compared by the time needed to
+process the same data.
+
+Usage: python benchmark_psi_compression.py [number of points] [precision] [psi file with sample data]
+'''
+
+import cranium
+import numpy as np
+import pandas as pd
+import os
+import tempfile
+import time
+from sys import argv
+
+def make_sample(rng,n):
+	'''
+	Create a random sample with columns x,y,z,ac,r,theta
+
+	:param np.random.RandomState rng: Random number generator
+	:param int n: Number of points in the sample
+	:returns: pd.DataFrame
+	'''
+
+	return(pd.DataFrame({
+		'x':rng.uniform(-300,300,n),
+		'y':rng.uniform(-100,100,n),
+		'z':rng.uniform(-100,100,n),
+		'ac':rng.uniform(-400,400,n),
+		'r':rng.gamma(2,5,n),
+		'theta':rng.uniform(-np.pi,np.pi,n)
+		}))
+
+if __name__=='__main__':
+
+	n = int(argv[1]) if len(argv) > 1 else 500000
+	precision = int(argv[2]) if len(argv) > 2 else None
+
+	#Use real data if a psi file is given
+	if len(argv) > 3:
+		df = cranium.read_psi(argv[3]).set_index('i')
+	else:
+		df = make_sample(np.random.RandomState(0),n)
+
+	outdir = tempfile.mkdtemp()
+	plain = os.path.join(outdir,'benchmark.psi')
+	cranium.write_data(plain,df,precision=precision)
+	size = os.path.getsize(plain)/1e6
+
+	print('codec','level','size (MB)','ratio','write MB/s','read MB/s')
+
+	for ext,levels in [('',[None]),('.gz',[1,6,9]),('.bz2',[1,9]),('.xz',[0,6])]:
+		for level in levels:
+			path = plain+ext
+
+			tic = time.time()
+			cranium.write_data(path,df,precision=precision,compresslevel=level)
+			tw = time.time()-tic
+
+			tic = time.time()
+			cranium.read_psi(path)
+			tr = time.time()-tic
+
+			csize = os.path.getsize(path)/1e6
+			print(ext or 'none',level,round(csize,1),round(size/csize,2),round(size/tw,1),round(size/tr,1))
+
+			if ext != '':
+				os.remove(path)
+
+	os.remove(plain)
+	os.remove(cranium.summary_path(plain))
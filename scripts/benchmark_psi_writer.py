@@ -0,0 +1,96 @@
+'''
+Benchmark writing psi files with write_data
+
+Compares formatting the whole dataframe with a single to_csv call (the previous workflow) with
+write_data at full precision, which writes the same bytes in chunks, and write_data with a fixed
+precision, which formats each chunk as a byte array with format_psi_rows.
+
+Usage: python benchmark_psi_writer.py [number of points] [output directory]
+'''
+
+import cranium
+import numpy as np
+import pandas as pd
+import os
+import tempfile
+import time
+from sys import argv
+
+def make_sample(rng,n):
+	'''
+	Create a random sample with columns x,y,z,ac,r,theta
+
+	:param np.random.RandomState rng: Random number generator
+	:param int n: Number of points in the sample
+	:returns: pd.DataFrame
+	'''
+
+	return(pd.DataFrame({
+		'x':rng.uniform(-300,300,n),
+		'y':rng.uniform(-100,100,n),
+		'z':rng.uniform(-100,100,n),
+		'ac':rng.uniform(-400,400,n),
+		'r':rng.gamma(2,5,n),
+		'theta':rng.uniform(-np.pi,np.pi,n)
+		}))
+
+def write_single(filepath,df):
+	'''
+	Write a psi file by formatting the whole dataframe into one string with to_csv
+
+	:param str filepath: Complete filepath to output file
+	:param pd.DataFrame df: Dataframe containing columns x,y,z,ac,r,theta
+	'''
+
+	f = open(filepath,'w')
+	cranium.write_header(f)
+	f.write(str(len(df.index))+' 0 0\n')
+	f.write('1 0 0\n'+'0 1 0\n'+'0 0 1\n')
+	f.write(df[['x','y','z','ac','theta','r']].to_csv(sep=' ', index=True, header=False))
+	f.close()
+
+def time_write(func,filepath,df,**kwargs):
+	'''
+	Time a writer and calculate the throughput
+
+	:param func: Function that writes `df` to `filepath`
+	:param str filepath: Complete filepath to output file
+	:param pd.DataFrame df: Dataframe containing columns x,y,z,ac,r,theta
+	:returns: Time in seconds and MB/s of the file that was written
+	'''
+
+	tic = time.time()
+	func(filepath,df,**kwargs)
+	t = time.time()-tic
+
+	return(t,os.path.getsize(filepath)/1e6/t)
+
+if __name__=='__main__':
+
+	if len(argv) > 1:
+		n = int(argv[1])
+	else:
+		n = 1000000
+
+	if len(argv) > 2:
+		outdir = argv[2]
+	else:
+		outdir = tempfile.mkdtemp()
+
+	df = make_sample(np.random.RandomState(0),n)
+	path = os.path.join(outdir,'benchmark.psi')
+
+	print('writer','time (s)','MB/s')
+
+	t,mbs = time_write(write_single,path,df)
+	print('to_csv single string',round(t,2),round(mbs,1))
+
+	t,mbs = time_write(cranium.write_data,path,df)
+	print('write_data full precision',round(t,2),round(mbs,1))
+
+	for p in [2,4,6]:
+		t,mbs = time_write(cranium.write_data,path,df,precision=p)
+		print('write_data precision',p,round(t,2),round(mbs,1))
+
+	os.remove(path)
+	os.remove(cranium.summary_path(path))
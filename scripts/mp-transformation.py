@@ -3,9 +3,11 @@ import multiprocessing as mp
 import time
 import os
 from functools import partial
-from sys import argv
+import argparse
 import re
 import json
+import sys
+import traceback
 
 class paramsClass:
 	'''
@@ -169,6 +171,21 @@ class paramsClass:
 
 		print('All parameter inputs are correct')
 
+def sample_size(num,P):
+	'''
+	Total size of the hdf5 files of every channel of a sample, which is used to start the largest samples first
+
+	:param int num: Index of the file in each channel directory
+	:param :class:`paramClass` P: Object containing all variables from config file
+	:returns: Size in bytes
+	'''
+
+	size = os.path.getsize(os.path.join(P.c1_dir,P.c1_files[num]))
+	for i in range(len(P.Lcdir)):
+		size += os.path.getsize(os.path.join(P.Lcdir[i],P.Lcfiles[i][num]))
+
+	return(size)
+
 def check_nums(P):
 	'''
 	Check that the numbers of files selected by the same list index match
@@ -252,10 +269,29 @@ def process(num,P=None):
 	toc = time.time()
 	print(num,'Complete',toc-tic)
 
+def run_sample(num,P=None):
+	'''
+	Run :py:func:`process` for a single sample and return its error instead of raising it, so that the other samples in the pool keep running
+
+	:param int num: Index of the file that is currently being processed
+	:param :class:`paramClass` P: Object containing all variables from config file
+	:returns: Tuple of `num` and the traceback of the error, which is None if the sample was processed
+	'''
+
+	try:
+		process(num,P)
+		return((num,None))
+	except Exception:
+		return((num,traceback.format_exc()))
+
 if __name__=='__main__':
 
-	f,config_path = argv
-	P = paramsClass(config_path)
+	parser = argparse.ArgumentParser(description='Transform every sample in the directories of a config file')
+	parser.add_argument('config',help='Complete path to the config file')
+	parser.add_argument('--jobs',type=int,default=None,help='Number of samples processed at a time, the number of cpus by default')
+	args = parser.parse_args()
+
+	P = paramsClass(args.config)
 
 	#Create out directory stamped with current date and time
 	outdir = os.path.join(P.rootdir,'Output'+time.strftime("%m-%d-%H-%M",time.localtime()))
@@ -263,18 +299,21 @@ if __name__=='__main__':
 	P.add_outdir(outdir)
 	print('outdir',outdir)
 
-	processfxn = partial(process,P=P)
+	processfxn = partial(run_sample,P=P)
 
+	#Start the largest samples first so that small samples fill in at the end
 	Lnums = check_nums(P)
-	n = len(Lnums)
-	# Initiate map pools in sets of 5 samples
-	for i in range(0,n,5):
-		if i+5>n:
-			L = Lnums[i:n]
-		else:
-			L = Lnums[i:i+5]
-
-		pool = mp.Pool()
-		pool.map(processfxn,L)
-		pool.close()
-		pool.join()
\ No newline at end of file
+	Lnums = sorted(Lnums,key=lambda num: sample_size(num,P),reverse=True)
+
+	#Use one pool for every sample and send each process a new sample as soon as it finishes one
+	#Errors are reported by sample so that one failed sample does not discard the others
+	failed = []
+	with mp.Pool(args.jobs) as pool:
+		for num,error in pool.imap_unordered(processfxn,Lnums):
+			if error != None:
+				print(num,'Failed',P.c1_files[num])
+				print(error)
+				failed.append(num)
+
+	if len(failed) > 0:
+		sys.exit('Failed samples '+', '.join([P.c1_files[num] for num in sorted(failed)]))
@@ -1,4 +1,11 @@
 
+import cranium
+import multiprocessing as mp
+import argparse
+import time
+import os
+from functools import partial
+from random import randint
 #import plotly
 
 #plotly.tools.set_credentials_file(username='msschwartz21', api_key='OrM0hMDBvseeT6SCjxNb')
@@ -21,6 +28,13 @@ def process_data(path):
 
 if __name__=='__main__':
 
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--jobs',type=int,default=None,help='Number of samples processed at a time, the number of cpus by default')
+	args = parser.parse_args()
+
+	#Use one pool for every sample and send each process a new sample as soon as it finishes one
+	pool = mp.Pool(args.jobs)
+
 	root = 'C:\\Users\\zfishlab\\Desktop\\zrf1wt13umyot21um'
 	stypes = ['wt']#,'yot'] #['wt','yot']
 	chs = ['AT2\\Prob','ZRF1']
@@ -58,20 +72,16 @@ if __name__=='__main__':
 			fit_dim=['x','z'],
 			flip_dim='z')
 
-		n = len(nums)
-		for i in range(0,n,5):
-			if i+5 > n:
-				L = nums[i:n]
-			else:
-				L = nums[i:i+5]
-
-			pool = mp.Pool()
-			pool.map(process_data,L)
-			pool.close()
-			pool.join()
+		#Start the largest files first so that small files fill in at the end
+		nums = sorted(nums,key=os.path.getsize,reverse=True)
+		for result in pool.imap_unordered(process_data,nums):
+			pass
 
 		print(stype, 'complete')
 
+	pool.close()
+	pool.join()
+
 
 	# for d in dirs:
 	# 	print(d)
@@ -3,6 +3,7 @@ import multiprocessing as mp
 import time
 import os
 import sys
+import argparse
 from pushbullet import Pushbullet
 from functools import partial
 from random import randint
@@ -48,6 +49,13 @@ def process(num,expname=None,outdir=None,gtype=None,adir=None,zdir=None):
 
 if __name__=='__main__':
 
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--jobs',type=int,default=None,help='Number of samples processed at a time, the number of cpus by default')
+	args = parser.parse_args()
+
+	#Use one pool for every sample and send each process a new sample as soon as it finishes one
+	pool = mp.Pool(args.jobs)
+
 	zrf2 = [
 		"D:\\zrfs\\ZRF2\\wt\\AT",
 		"D:\\zrfs\\ZRF2\\wt\\ZRF2",
@@ -89,19 +97,13 @@ if __name__=='__main__':
 
 		print(nums)
 
-		n = len(nums)
-		for i in range(0,n,5):
-			if i+5>n:
-				L = nums[i:n]
-			else:
-				L = nums[i:i+5]
-
-			# if i >= 5: break
-
-			pool = mp.Pool()
-			pool.map(processfxn,L)
-			pool.close()
-			pool.join()
+		#Start the largest samples first so that small samples fill in at the end
+		nums = sorted(nums,key=lambda num: os.path.getsize(os.path.join(adir,'AT_'+num+'_Probabilities.h5'))
+			+os.path.getsize(os.path.join(zdir,Lgtype[i]+'_'+num+'_Probabilities.h5')),reverse=True)
+		for result in pool.imap_unordered(processfxn,nums):
+			pass
 
+		print('complete',root)
 
-		print('complete',root)
\ No newline at end of file
+	pool.close()
+	pool.join()
\ No newline at end of file
@@ -2,6 +2,7 @@ import os
 import numpy as np
 import cranium
 import multiprocessing as mp
+import argparse
 
 genthresh = 0.5
 medthresh = 0.25
@@ -38,18 +39,22 @@ ddir = "D:\\Wildtype_for_modeling\\Prob"
 
 if __name__=='__main__':
 
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--jobs',type=int,default=None,help='Number of samples processed at a time, the number of cpus by default')
+	args = parser.parse_args()
+
+	#Use one pool for every sample and send each process a new sample as soon as it finishes one
+	pool = mp.Pool(args.jobs)
+
 	num=[]
 	for f in os.listdir(ddir):
 		if 'Probabilities' in f and 'h5' in f:
 			num.append(os.path.join(ddir,f))
 
-	for i in range(0,len(num),5):
-		if i+5>len(num):
-			L = num[i:len(num)]
-		else:
-			L = num[i:i+5]
+	#Start the largest files first so that small files fill in at the end
+	num = sorted(num,key=os.path.getsize,reverse=True)
+	for result in pool.imap_unordered(process,num):
+		pass
 
-		pool = mp.Pool()
-		pool.map(process,L)
-		pool.close()
-		pool.join()
\ No newline at end of file
+	pool.close()
+	pool.join()
\ No newline at end of file
@@ -1,5 +1,30 @@
 import os
+import sys
+import time
 import numpy as np
 import cranium
 import multiprocessing as mp
 
+anum = 30
+tstep = np.pi/4
+percbins = [50]
+rnull = 15
+
+if __name__=='__main__':
+
+	#Directory of psi files, string used to select files and output csv
+	directory,dtype,outpath = sys.argv[1:4]
+
+	tic = time.time()
+
+	dfs = cranium.read_psi_to_dict(directory,dtype)
+
+	lm = cranium.landmarks(percbins=percbins,rnull=rnull)
+	lm.calc_bins(dfs.values(),anum,tstep)
+
+	#Calculate landmarks of each sample in a separate process
+	lt = lm.calc_all(dfs,dtype,n_jobs=mp.cpu_count())
+	lt.to_dataframe().to_csv(outpath)
+
+	toc = time.time()
+	print(len(dfs),'samples',toc-tic)
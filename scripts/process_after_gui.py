@@ -3,6 +3,7 @@ import multiprocessing as mp
 import time
 import os
 import sys
+import argparse
 from functools import partial
 from random import randint
 
@@ -24,6 +25,13 @@ def transform_file(f):
 
 if __name__=='__main__':
 
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--jobs',type=int,default=None,help='Number of samples processed at a time, the number of cpus by default')
+	args = parser.parse_args()
+
+	#Use one pool for every sample and send each process a new sample as soon as it finishes one
+	pool = mp.Pool(args.jobs)
+
 	outdirs = [ "C:\\Users\\zfishlab\\Desktop\\zrf1wt13umyot21um\\yot\\PostThetaFix10_17"
 	#"C:\\Users\\zfishlab\\Desktop\\zrf1wt13umyot21um\\wt\\PostThetaFix10_17"
 		
@@ -31,20 +39,15 @@ if __name__=='__main__':
 
 	for outdir in outdirs:
 
-		files = os.listdir(outdir)
-
-		os.chdir(outdir)
+		#The processes of the pool keep the working directory they started in, so give them complete paths
+		files = [os.path.join(outdir,f) for f in os.listdir(outdir)]
 
-		n = len(files)
-		for i in range(0,n,5):
-			if i+5>n:
-				L = files[i:n]
-			else:
-				L = files[i:i+5]
+		#Start the largest files first so that small files fill in at the end
+		files = sorted(files,key=os.path.getsize,reverse=True)
+		for result in pool.imap_unordered(transform_file,files):
+			pass
 
-			pool = mp.Pool()
-			pool.map(transform_file,L)
-			pool.close()
-			pool.join()
+		print('Processing complete')
 
-		print('Processing complete')
\ No newline at end of file
+	pool.close()
+	pool.join()
\ No newline at end of file
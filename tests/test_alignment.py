@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.decomposition import PCA
+import cranium
+
+def make_points(sign=1,n=300,seed=0):
+	#Points scattered around a parabola that is tilted out of the xz plane
+	rng = np.random.RandomState(seed)
+	x = rng.uniform(-20,20,n)
+	z = sign*0.05*x**2 + rng.normal(0,1,n)
+	y = rng.normal(0,3,n)
+	X = np.stack([x,y,z],axis=1)
+
+	a = 0.3
+	R = np.array([[np.cos(a),0,np.sin(a)],[0,1,0],[-np.sin(a),0,np.cos(a)]])
+	X = np.dot(X,R.T)+[5,-2,7]
+	return(pd.DataFrame(X,columns=['x','y','z']))
+
+def reference_align(df,pca,comp_order,fit_dim,deg=2):
+	#Alignment calculated with separate dataframes and np.polyfit for each step
+	fit = pca.transform(df[['x','y','z']])
+	df_fit = pd.DataFrame({'x':fit[:,comp_order[0]],'y':fit[:,comp_order[1]],'z':fit[:,comp_order[2]]})
+
+	model = np.polyfit(df_fit[fit_dim[0]],df_fit[fit_dim[1]],deg=deg)
+	vx = -model[1]/(2*model[0])
+	vertex = [vx,df_fit.y.mean(),np.poly1d(model)(vx)]
+
+	df_align = df_fit-vertex
+	flip = model[0] < 0
+	if flip:
+		df_align = cranium.brain().flip_data(df_align)
+
+	mm = np.polyfit(df_align[fit_dim[0]],df_align[fit_dim[1]],deg=deg)
+	return(df_align,vertex,flip,mm)
+
+@pytest.mark.parametrize('dx,dy,fx,fy',[(0,0,1,1),(3.5,-1.2,1,1),(0,0,-1,-1),(-2,4,-1,-1)])
+def test_poly_sums_matches_polyfit(dx,dy,fx,fy):
+	rng = np.random.RandomState(1)
+	x = rng.uniform(-10,30,500)
+	y = 0.3*x**2-2*x+rng.normal(0,5,500)
+
+	ps = cranium.poly_sums(2)
+	ps.add(x,y)
+	ps.translate(dx,dy)
+	ps.scale(fx,fy)
+
+	ref = np.polyfit((x-dx)*fx,(y-dy)*fy,2)
+	assert np.allclose(ps.fit(),ref,rtol=1e-8,atol=1e-10)
+	assert np.allclose(ps.fit(1),np.polyfit((x-dx)*fx,(y-dy)*fy,1),rtol=1e-8,atol=1e-10)
+
+@pytest.mark.parametrize('dims',[['x','y','z'],['y','z']])
+def test_pca_moments_matches_pca(dims):
+	rng = np.random.RandomState(2)
+	vol = rng.rand(6,20,30)
+	vol[:,5:15,3:25] += 0.5
+	microns = [0.16,0.16,0.21]
+
+	pm = cranium.pca_moments()
+	for z in range(vol.shape[0]):
+		pm.add_plane(vol[z],z,0.9,microns)
+	pm.fit(dims)
+
+	z,y,x = np.where(vol > 0.9)
+	df = pd.DataFrame({'x':x*microns[0],'y':y*microns[1],'z':z*microns[2]})
+	pca = PCA().fit(df[dims])
+
+	assert np.allclose(pm.mean_,pca.mean_)
+	assert np.allclose(pm.explained_variance_,pca.explained_variance_)
+
+	#Components are only defined up to their sign
+	signs = np.sign(np.sum(pm.components_*pca.components_,axis=1))
+	assert np.allclose(pm.components_,pca.components_*signs[:,np.newaxis])
+	assert np.allclose(np.abs(pm.transform(df[dims])),np.abs(pca.transform(df[dims])))
+
+@pytest.mark.parametrize('sign',[1,-1])
+def test_alignment_transform_matches_reference(sign):
+	df = make_points(sign)
+	pca = PCA().fit(df)
+	comp_order,fit_dim = [0,2,1],['x','z']
+
+	s = cranium.brain()
+	s.pca_transform_3d(df,pca,comp_order,fit_dim)
+	ref,vertex,flip,mm = reference_align(df,pca,comp_order,fit_dim)
+
+	assert np.allclose(s.df_align[['x','y','z']].values,ref[['x','y','z']].values)
+	assert np.allclose(s.vertex,vertex)
+	assert np.allclose(s.mm.cf,mm)
+
+	#A second channel aligned with the transform of the first
+	other = make_points(sign,n=100,seed=5)
+	c = cranium.brain()
+	c.apply_transform(other,s.transform,s.mm)
+	fit = pca.transform(other)[:,comp_order]-vertex
+	if flip:
+		fit = fit*[-1,1,-1]
+	assert np.allclose(c.df_align[['x','y','z']].values,fit)
+
+	#Coordinates relative to the math model are unchanged
+	r = cranium.brain()
+	r.df_align = ref[['x','y','z']].copy()
+	r.mm = cranium.math_model(mm)
+	r.transform_coordinates()
+	s.transform_coordinates()
+	assert np.allclose(s.df_align[['ac','r','theta']].values,r.df_align[['ac','r','theta']].values)
+
+def aligned_embryo(outdir):
+	df = make_points(-1)
+	e = cranium.embryo('AT',1,str(outdir))
+	e.chnls['c1'] = cranium.brain()
+	e.chnls['c1'].df_thresh = df
+	e.chnls['c1'].pca_transform_3d(df,PCA().fit(df),[0,2,1],['x','z'])
+	return(e)
+
+def test_alignment_record_round_trip(tmp_path):
+	e = aligned_embryo(tmp_path)
+	e.save_alignment('c1','AT_01_Probabilities.h5')
+
+	f = cranium.embryo('AT',1,str(tmp_path/'new'))
+	f.chnls['c1'] = cranium.brain()
+	f.chnls['c1'].df_thresh = e.chnls['c1'].df_thresh
+	f.load_alignment(e.alignment_path(),'AT_01_Probabilities.h5')
+	f.apply_alignment('c1')
+
+	assert np.allclose(f.transform.matrix,e.chnls['c1'].transform.matrix)
+	assert np.allclose(f.mm.cf,e.chnls['c1'].mm.cf)
+	assert np.allclose(f.vertex,e.chnls['c1'].vertex)
+	assert np.allclose(f.chnls['c1'].df_align.values,e.chnls['c1'].df_align.values)
+
+def test_alignment_record_source_mismatch(tmp_path):
+	e = aligned_embryo(tmp_path)
+	e.save_alignment('c1','AT_01_Probabilities.h5')
+
+	with pytest.raises(ValueError):
+		e.load_alignment(source='AT_02_Probabilities.h5')
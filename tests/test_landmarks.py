@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+import pytest
+import cranium
+
+def make_tensor():
+	rng = np.random.RandomState(0)
+	dfs = {}
+	for i in range(6):
+		dfs[str(i)] = pd.DataFrame({
+			'i':np.arange(3000),
+			'ac':rng.uniform(-97.3,97.3,3000),
+			'theta':rng.uniform(-np.pi,np.pi,3000),
+			'r':rng.gamma(2,5,3000)
+			})
+
+	lm = cranium.landmarks(percbins=[10,50,90],rnull=15)
+	lm.calc_bins(list(dfs.values()),23,np.pi/7)
+	return(lm.calc_tensor(dfs,'wt'))
+
+def test_reformat_to_cart_tensor_matches_columns():
+	lt = make_tensor()
+
+	key = ['x','t','r']
+	wide = cranium.reformat_to_cart(lt.to_dataframe()).sort_values(key).reset_index(drop=True)
+	tensor = cranium.reformat_to_cart(lt).sort_values(key).reset_index(drop=True)
+
+	pd.testing.assert_frame_equal(wide,tensor,check_exact=False,rtol=0,atol=1e-12)
+
+def test_tensor_centers_match_column_names():
+	lt = make_tensor()
+	lmk = cranium.parse_lmk_columns(lt.to_dataframe().columns)
+
+	assert np.array_equal(np.unique((lmk.amn+lmk.amx)/2),np.unique(lt.x))
+	assert np.array_equal(np.unique((lmk.tmn+lmk.tmx)/2),np.unique(lt.t))
+
+def test_calc_perc_dataframe_deprecated():
+	rng = np.random.RandomState(1)
+	df = pd.DataFrame({'i':np.arange(500),'ac':rng.uniform(-50,50,500),'theta':rng.uniform(-np.pi,np.pi,500),'r':rng.gamma(2,5,500)})
+	lm = cranium.landmarks(percbins=[50],rnull=15)
+	lm.calc_bins([df],5,np.pi/2)
+
+	rows = pd.concat(lm.calc_perc(df,'2','wt',lm.calc_perc(df,'1','wt',[])))
+	with pytest.deprecated_call():
+		out = lm.calc_perc(df,'2','wt',lm.calc_perc(df,'1','wt',pd.DataFrame()))
+
+	pd.testing.assert_frame_equal(out,rows)
+
+def make_samples(seed,n=6,scale=5):
+	rng = np.random.RandomState(seed)
+	return(dict((str(i),pd.DataFrame({
+		'i':np.arange(1000),
+		'ac':rng.uniform(-60,60,1000),
+		'theta':rng.uniform(-np.pi,np.pi,1000),
+		'r':rng.gamma(2,scale,1000)
+		})) for i in range(n)))
+
+def test_anum_select_objects_are_independent():
+	a = cranium.anumSelect(make_samples(0,scale=1))
+	b = cranium.anumSelect(make_samples(1,scale=10))
+
+	a.calc_variance(5,np.pi/4,[50],15)
+	b.calc_variance(5,np.pi/4,[50],15)
+	a.calc_variance(5,np.pi/4,[50],15)
+
+	assert a.Msv[0] == a.Msv[1]
+	assert a.Msv[0] != b.Msv[0]
+
+def test_param_sweep_pool_matches_serial():
+	dfs = make_samples(2)
+	serial = cranium.anumSelect(dfs)
+	serial.param_sweep(np.pi/4,amn=3,amx=7,percbins=[50],rnull=15)
+	pooled = cranium.anumSelect(dfs)
+	pooled.param_sweep(np.pi/4,amn=3,amx=7,percbins=[50],rnull=15,n_jobs=2)
+
+	assert np.allclose(serial.Msv,pooled.Msv)
+	assert np.allclose(serial.Mbv,pooled.Mbv)
+	assert len(cranium.sweep_state) == 0
+
+def test_landmark_test_rejects_mismatched_bins():
+	wt = make_tensor()
+	mt = cranium.landmark_tensor(wt.arr,wt.snums,wt.stypes,wt.acbins*2,wt.tbins,wt.percbins)
+
+	with pytest.raises(ValueError):
+		cranium.landmark_test(wt,mt,n_resamples=10)
+
+def test_landmark_test_pool_matches_serial():
+	wt = make_tensor()
+	mt = cranium.landmark_tensor(wt.arr*1.1,wt.snums,wt.stypes,wt.acbins,wt.tbins,wt.percbins)
+
+	p,d = cranium.landmark_test(wt,mt,n_resamples=50,max_bytes=2**14,seed=0)
+	pp,dp = cranium.landmark_test(wt,mt,n_resamples=50,max_bytes=2**14,seed=0,n_jobs=2)
+
+	assert np.array_equal(p,pp)
+	assert np.array_equal(d,dp,equal_nan=True)
+
+def reference_perc(lm,df,snum,dtype):
+	#Landmarks calculated by filtering the dataframe for every bin and percentile
+	D = {'stype':dtype}
+	for a in range(len(lm.acbins)-1):
+		arange = [lm.acbins[a],lm.acbins[a+1]]
+		for t in range(len(lm.tbins)-1):
+			trange = [lm.tbins[t],lm.tbins[t+1]]
+			for p in lm.percbins:
+				d = df[(df.ac > arange[0]) & (df.ac < arange[1])]
+				d = d[(d.theta > trange[0]) & (d.theta < trange[1])]
+
+				if len(d.index) > 0:
+					r = np.percentile(d.r,p)
+					pts = d[d.r < r].count()['i']
+				else:
+					r = lm.rnull
+					pts = 0
+
+				name = '_'.join([str(np.around(s,decimals=2)) for s in arange+trange])
+				D[name+'_'+str(p)+'_pts'] = pts
+				D[name+'_'+str(p)+'_r'] = r
+
+	return(pd.Series(D,name=int(snum)))
+
+def test_calc_tensor_matches_reference():
+	rng = np.random.RandomState(3)
+	dfs = {}
+	for s in range(3):
+		#No points between -10 and 10 so that those bins use rnull, and some points lie on the boundaries
+		ac = np.concatenate([rng.uniform(-30,-10,200),rng.uniform(10,30,200),[-10,10,20,20]])
+		theta = np.concatenate([rng.uniform(-np.pi,np.pi,400),[0,0,0,np.pi/3]])
+		dfs[str(s)] = pd.DataFrame({'i':np.arange(len(ac)),'ac':ac,'theta':theta,'r':rng.gamma(2,5,len(ac))})
+
+	lm = cranium.landmarks(percbins=[10,50,90],rnull=15)
+	lm.acbins = np.array([-30.,-10.,10.,30.])
+	lm.tbins = np.array([-np.pi,-np.pi/3,0,np.pi/3,np.pi])
+
+	out = lm.calc_tensor(dfs,'wt').to_dataframe()
+	ref = pd.DataFrame([reference_perc(lm,dfs[k],k,'wt') for k in dfs.keys()])
+
+	assert list(out.columns) == list(ref.columns)
+	assert (ref.filter(like='-10.0_10.0').filter(like='_r') == 15).all().all()
+	pd.testing.assert_frame_equal(out,ref,check_dtype=False)
+
+def sketch_samples():
+	dfs = make_samples(4)
+	lm = cranium.landmarks(percbins=[10,50,90],rnull=15)
+	lm.calc_bins(list(dfs.values()),6,np.pi/2)
+	return(lm,dfs)
+
+@pytest.mark.parametrize('accuracy',[0.01,0.05])
+def test_sketch_relative_error(accuracy):
+	lm,dfs = sketch_samples()
+
+	for df in dfs.values():
+		arr = lm.calc_sketch(df,accuracy).calc_array(lm.percbins,lm.rnull)
+		exact = lm.calc_perc_array(df)
+		assert np.max(np.abs(arr[...,0]-exact[...,0])/exact[...,0]) <= accuracy
+
+def test_merged_sketches_match_concatenation():
+	lm,dfs = sketch_samples()
+
+	merged = cranium.merge_sketches([lm.calc_sketch(df) for df in dfs.values()])
+	whole = lm.calc_sketch(pd.concat(dfs.values()))
+
+	assert np.array_equal(merged.calc_array(lm.percbins,lm.rnull),whole.calc_array(lm.percbins,lm.rnull))
+
+def test_sketch_psi_matches_dataframe(tmp_path):
+	lm,dfs = sketch_samples()
+	df = dfs['0']
+	path = str(tmp_path/'sample.psi')
+	cranium.write_data(path,df.assign(x=0.0,y=0.0,z=0.0))
+
+	sk = lm.sketch_psi(path,chunksize=300)
+	assert np.array_equal(sk.calc_array(lm.percbins,lm.rnull),lm.calc_sketch(df).calc_array(lm.percbins,lm.rnull))
+
+def test_landmark_stats_merge_matches_single_accumulator():
+	lt = make_tensor()
+
+	single = cranium.landmark_stats(lt.acbins,lt.tbins,lt.percbins)
+	for arr in lt.arr:
+		single.add(arr)
+
+	parts = []
+	for i in [slice(0,2),slice(2,3),slice(3,6)]:
+		ls = cranium.landmark_stats(lt.acbins,lt.tbins,lt.percbins)
+		ls.add_tensor(cranium.landmark_tensor(lt.arr[i],lt.snums[i],lt.stypes[i],lt.acbins,lt.tbins,lt.percbins))
+		parts.append(ls)
+	merged = parts[0].merge(parts[1]).merge(parts[2])
+
+	assert np.array_equal(merged.n,single.n)
+	assert np.allclose(merged.mean,single.mean)
+	assert np.allclose(merged.sem(),single.sem())
+
+def test_landmark_stats_table_matches_reformat_to_cart():
+	lt = make_tensor()
+	ls = cranium.landmark_stats(lt.acbins,lt.tbins,lt.percbins)
+	for arr in lt.arr:
+		ls.add(arr)
+
+	key = ['x','t','r']
+	table = ls.to_dataframe().sort_values(key).reset_index(drop=True)
+	wide = cranium.reformat_to_cart(lt.to_dataframe()).sort_values(key).reset_index(drop=True)
+
+	pd.testing.assert_frame_equal(table,wide,check_exact=False,rtol=0,atol=1e-9)
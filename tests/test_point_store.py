@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+import cranium
+
+def make_points(n,seed):
+	rng = np.random.RandomState(seed)
+	df = pd.DataFrame(rng.rand(n,6),columns=['x','y','z','ac','r','theta'])
+	df.index = np.arange(n)*2
+	return(df)
+
+def test_append_read(tmp_path):
+	path = str(tmp_path/'store.h5')
+	a,b = make_points(100,0),make_points(50,1)
+	with cranium.point_store(path) as store:
+		store.append('AT','01',a)
+		store.append('AT','02',b,meta={'n':50})
+
+	with cranium.point_store(path,'r') as store:
+		assert store.channels() == ['AT']
+		assert store.samples('AT') == ['01','02']
+		assert store.metadata('AT','02') == {'n':50}
+		dfs = store.read('AT',columns=['i','ac','r'])
+
+	assert np.array_equal(dfs['01'].i.values,a.index.values)
+	assert np.array_equal(dfs['01'][['ac','r']].values,a[['ac','r']].values)
+	assert np.array_equal(dfs['02'][['ac','r']].values,b[['ac','r']].values)
+
+def test_append_duplicate(tmp_path):
+	path = str(tmp_path/'store.h5')
+	with cranium.point_store(path) as store:
+		store.append('AT','01',make_points(10,0))
+		with pytest.raises(ValueError):
+			store.append('AT','01',make_points(10,1))
+
+def test_interrupted_append(tmp_path):
+	path = str(tmp_path/'store.h5')
+	a,b = make_points(100,0),make_points(50,1)
+	with cranium.point_store(path) as store:
+		store.append('AT','01',a)
+		#Columns and part of the index written by an append that did not finish
+		g = store.f['AT']
+		for c in g['columns']:
+			g['columns/'+c].resize((130,))
+		for name in ['samples','meta','offset']:
+			g[name].resize((2,))
+
+	with cranium.point_store(path) as store:
+		assert store.samples('AT') == ['01']
+		assert store.f['AT/columns/x'].shape[0] == 100
+		store.append('AT','02',b)
+		dfs = store.read('AT')
+
+	assert np.array_equal(dfs['02'][['x','y','z','ac','r','theta']].values,b.values)
+	assert np.array_equal(dfs['01'].i.values,a.index.values)
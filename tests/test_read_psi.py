@@ -0,0 +1,201 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import cranium
+
+@pytest.fixture
+def points():
+	rng = np.random.RandomState(0)
+	n = 5000
+	return(pd.DataFrame({
+		'x':rng.rand(n),
+		'y':rng.rand(n),
+		'z':rng.rand(n),
+		'ac':rng.uniform(-100,100,n),
+		'r':rng.rand(n),
+		'theta':rng.rand(n)
+		}))
+
+def touch_later(path):
+	#Modification times can be equal for files written within the resolution of the file system clock
+	st = os.stat(path)
+	os.utime(path,ns=(st.st_atime_ns,st.st_mtime_ns+10**9))
+
+def expected(path,ac_range):
+	df = cranium.read_psi(path)
+	return(df[(df.ac >= ac_range[0]) & (df.ac <= ac_range[1])])
+
+@pytest.mark.parametrize('name,kw',[
+	('unsorted.psi',{}),
+	('sorted.psi',{'sort_ac':True,'chunksize':500}),
+	('unsorted.psi.gz',{}),
+	('sorted.psi.gz',{'sort_ac':True,'chunksize':500}),
+	('unsorted.psi.bz2',{}),
+	('unsorted.psi.xz',{})
+	])
+def test_ac_range(tmp_path,points,name,kw):
+	path = str(tmp_path/name)
+	cranium.write_data(path,points,**kw)
+
+	df = cranium.read_psi(path,ac_range=(-10,10))
+	pd.testing.assert_frame_equal(df,expected(path,(-10,10)))
+	assert len(df.index) > 0
+
+def test_ac_range_columns(tmp_path,points):
+	path = str(tmp_path/'sorted.psi')
+	cranium.write_data(path,points,sort_ac=True,chunksize=500)
+
+	df = cranium.read_psi(path,columns=['r','theta'],ac_range=(-10,10))
+	assert list(df.columns) == ['r','theta']
+	pd.testing.assert_frame_equal(df,expected(path,(-10,10))[['r','theta']])
+
+def test_ac_range_outside(tmp_path,points):
+	path = str(tmp_path/'sorted.psi')
+	cranium.write_data(path,points,sort_ac=True,chunksize=500)
+
+	assert len(cranium.read_psi(path,ac_range=(200,300)).index) == 0
+
+def test_ac_range_without_summary(tmp_path,points):
+	path = str(tmp_path/'nosummary.psi')
+	cranium.write_data(path,points)
+	os.remove(cranium.summary_path(path))
+
+	pd.testing.assert_frame_equal(cranium.read_psi(path,ac_range=(-10,10)),expected(path,(-10,10)))
+
+def test_ac_range_binary(tmp_path,points):
+	path = str(tmp_path/'sorted.psi')
+	cranium.write_data(path,points,sort_ac=True,chunksize=500,binary=True)
+
+	df = cranium.read_psi(path,ac_range=(-10,10))
+	ref = points.sort_values('ac',kind='mergesort')
+	ref = ref[(ref.ac >= -10) & (ref.ac <= 10)]
+	assert np.array_equal(df.ac.values,ref.ac.values)
+
+def test_compressed_companions(tmp_path,points):
+	path = str(tmp_path/'sample.psi')
+	cranium.write_data(path,points,sort_ac=True,chunksize=500,binary=True)
+	cranium.write_data(path+'.gz',points.iloc[:100])
+
+	assert cranium.summary_path(path) != cranium.summary_path(path+'.gz')
+	assert cranium.binary_path(path) != cranium.binary_path(path+'.gz')
+	assert cranium.read_psi_summary(path)['n'] == len(points.index)
+	assert cranium.read_psi_summary(path+'.gz')['n'] == 100
+	assert not os.path.isfile(cranium.binary_path(path+'.gz'))
+
+	pd.testing.assert_frame_equal(cranium.read_psi(path,ac_range=(-10,10)),expected(path,(-10,10)))
+
+def test_ac_range_rewritten_file(tmp_path,points):
+	path = str(tmp_path/'sorted.psi')
+	cranium.write_data(path,points,sort_ac=True,chunksize=500)
+	summary = open(cranium.summary_path(path)).read()
+
+	#Rewrite the psi file without sorting, keeping the old summary
+	cranium.write_data(path,points.iloc[::-1])
+	open(cranium.summary_path(path),'w').write(summary)
+	touch_later(path)
+
+	assert cranium.read_psi_summary(path) == None
+	pd.testing.assert_frame_equal(cranium.read_psi(path,ac_range=(-10,10)),expected(path,(-10,10)))
+
+def test_summary_dict_rewritten_file(tmp_path,points):
+	path = str(tmp_path/'AT_01_AT.psi')
+	cranium.write_data(path,points)
+	summary = open(cranium.summary_path(path)).read()
+
+	cranium.write_data(path,points.assign(ac=points.ac*2))
+	open(cranium.summary_path(path),'w').write(summary)
+	touch_later(path)
+
+	sums = cranium.read_summary_dict(str(tmp_path),'AT')
+	assert list(sums.values())[0]['ac'] == [float((points.ac*2).min()),float((points.ac*2).max())]
+
+def test_binary_round_trip(tmp_path,points):
+	path = str(tmp_path/'sample.psi')
+	cranium.write_data(path,points,binary=True)
+
+	df = cranium.read_binary(cranium.binary_path(path))
+	assert np.array_equal(df.index.values,points.index.values)
+	assert np.array_equal(df[['x','y','z','ac','theta','r']].values,points[['x','y','z','ac','theta','r']].values)
+
+	#read_psi uses the binary copy and gives the same values as the text
+	os.remove(cranium.binary_path(path))
+	text = cranium.read_psi(path)
+	cranium.write_binary(path,points)
+	pd.testing.assert_frame_equal(cranium.read_psi(path),text,check_dtype=False)
+
+def data_lines(path):
+	with cranium.open_psi(path) as f:
+		return(f.readlines()[19:])
+
+@pytest.mark.parametrize('precision',[0,1,2,3,6,9])
+def test_precision_matches_to_csv(tmp_path,points,precision):
+	df = points.copy()
+	#Negative zero, values that round to zero, halfway values and large values
+	df.iloc[:6,:] = [[-0.0,-0.001,0.125,2.5,-2.5,1e6+0.5]]*6
+	path = str(tmp_path/'sample.psi')
+	cranium.write_data(path,df,precision=precision,chunksize=1000)
+
+	columns = ['x','y','z','ac','theta','r']
+	ref = df[columns].to_csv(sep=' ',header=False,float_format='%.'+str(precision)+'f')
+	assert ''.join(data_lines(path)) == ref
+
+def test_precision_non_finite(tmp_path,points):
+	df = points.copy()
+	df.iloc[3,0] = np.nan
+	df.iloc[4,1] = np.inf
+	path = str(tmp_path/'sample.psi')
+	cranium.write_data(path,df,precision=3)
+
+	ref = df[['x','y','z','ac','theta','r']].to_csv(sep=' ',header=False,float_format='%.3f')
+	assert ''.join(data_lines(path)) == ref
+
+def test_read_psi_keeps_first_point(tmp_path,points):
+	path = str(tmp_path/'sample.psi')
+	cranium.write_data(path,points)
+
+	df = cranium.read_psi(path)
+	assert list(df.columns) == ['i','x','y','z','ac','theta','r']
+	assert len(df.index) == len(points.index)
+	assert df.i.iloc[0] == points.index[0]
+	assert np.allclose(df[['x','ac','r']].values,points[['x','ac','r']].values,rtol=1e-12,atol=0)
+
+def test_read_psi_columns_and_dtype(tmp_path,points):
+	path = str(tmp_path/'sample.psi')
+	cranium.write_data(path,points)
+
+	df = cranium.read_psi(path,columns=['r','ac'],dtype=np.float32)
+	assert list(df.columns) == ['r','ac']
+	assert df.r.dtype == np.float32
+	assert np.allclose(df.r.values,points.r.values)
+
+	chunks = list(cranium.read_psi_chunks(path,1200,columns=['ac']))
+	assert sum([len(c.index) for c in chunks]) == len(points.index)
+	assert np.allclose(pd.concat(chunks).ac.values,points.ac.values,rtol=1e-12,atol=0)
+
+@pytest.mark.parametrize('name',['deferred.psi','deferred.psi.gz'])
+def test_deferred_count(tmp_path,points,name):
+	path = str(tmp_path/name)
+	with cranium.psi_writer(path) as w:
+		for i in range(0,len(points.index),1200):
+			w.write_chunk(points.iloc[i:i+1200])
+
+	with cranium.open_psi(path) as f:
+		lines = f.readlines()
+	count = str(len(points.index))
+	if name.endswith('.gz'):
+		assert lines[15] == count+' 0 0\n'
+	else:
+		assert lines[15] == count.ljust(cranium.psi_writer.width)+' 0 0\n'
+
+	df = cranium.read_psi(path)
+	assert len(df.index) == len(points.index)
+	assert np.array_equal(df.i.values,points.index.values)
+	assert np.allclose(df[['x','ac','r']].values,points[['x','ac','r']].values,rtol=1e-12,atol=0)
+	assert cranium.read_psi_summary(path)['n'] == len(points.index)
+
+def test_declared_count_mismatch(tmp_path,points):
+	path = str(tmp_path/'sample.psi')
+	with pytest.raises(ValueError):
+		with cranium.psi_writer(path,n=len(points.index)+1) as w:
+			w.write_chunk(points)